@@ -0,0 +1,297 @@
+"""
+Headless GridPing: pings a target list and streams one line per host to
+stdout, as JSON lines or CSV, followed by a summary. Nothing from Qt is
+imported, and the heavier modules only when they're needed.
+
+  python cli.py 10.0.0.0/24,www.example.com --count 5 --format csv
+
+With --every, the targets are pinged again every so many seconds until
+interrupted, and a summary is written after every round. Adding
+--change-only, only hosts whose state changed are written after the first
+round, and hosts going up or down get a transition record.
+With --history, every sample is also kept in an SQLite database (see
+lib.history_store).
+"""
+from __future__ import division
+import sys, time, json, socket, argparse
+from lib.util import RequestData, SummaryData, WIRE_OVERHEAD
+from lib.targets import parseTargets
+from lib.stats import RunningStats, QuantileSketch
+from lib import wire
+
+DISTRIBUTIONS = {"constant": RequestData.DISTRIBUTION_CONSTANT,
+                 "uniform": RequestData.DISTRIBUTION_UNIFORM,
+                 "gaussian": RequestData.DISTRIBUTION_GAUSSIAN,
+                 "poisson": RequestData.DISTRIBUTION_POISSON,
+                 "exponential": RequestData.DISTRIBUTION_EXPONENTIAL}
+BACKENDS = {"auto": RequestData.BACKEND_AUTO, "icmp": RequestData.BACKEND_RAW_ICMP,
+            "icmp-dgram": RequestData.BACKEND_DGRAM_ICMP, "tcp": RequestData.BACKEND_TCP,
+            "fake": RequestData.BACKEND_FAKE}
+HOST_FIELDS = ["timestamp", "host", "sent", "received", "lost", "loss_percentage",
+               "rtt_avg", "rtt_min", "rtt_max"]
+
+
+class ResultPrinter(object):
+  """
+  Takes frames from a pinger (it can stand in for the reply pipe, see
+  send_bytes) and writes a line per host once its last packet is in.
+  Only hosts still being pinged are kept in memory. The summary written at
+  the end of every monitoring round covers the whole run so far.
+  """
+  def __init__(self, targets, outputFormat, out=sys.stdout, reqData=None):
+    super(ResultPrinter, self).__init__()
+    self.targets = targets
+    self.req_data = reqData
+    self.start_time = time.time()
+    self.format = outputFormat
+    self.out = out
+    self.hosts = {} #index -> [sent, lost, RunningStats, last rtt]
+    self.sent_packets = 0
+    self.received_packets = 0
+    self.rtt_stats = RunningStats()
+    self.rtt_sketch = QuantileSketch()
+    self.resolve_stats = RunningStats()
+    self.done_hosts = 0
+    self.finished = False
+    if self.format == "csv":
+      self.out.write(",".join(HOST_FIELDS) + "\n")
+
+  def send_bytes(self, frame):
+    if wire.frameType(frame) == wire.FRAME_FINAL:
+      self.finished = True
+      return
+    if wire.frameType(frame) == wire.FRAME_RESOLVE:
+      for index, ms in wire.iterRecords(frame):
+        self.resolve_stats.add(ms)
+      return
+    if wire.frameType(frame) == wire.FRAME_ROUND:
+      for round_number, timestamp in wire.iterRecords(frame):
+        self.writeSummary(round_number)
+      return
+    if wire.frameType(frame) == wire.FRAME_TRANSITION:
+      for index, timestamp, state in wire.iterRecords(frame):
+        self.writeRecord({"type": "transition", "timestamp": timestamp,
+                          "host": self.targets[index],
+                          "state": "up" if state == wire.TRANSITION_UP else "down"})
+      return
+    if wire.frameType(frame) == wire.FRAME_TOTALS: #hosts held back as unchanged
+      for hosts, sent, lost, mean, m2, rtt_min, rtt_max in wire.iterRecords(frame):
+        self.done_hosts += hosts
+        self.sent_packets += sent
+        self.received_packets += sent - lost
+        self.rtt_stats.merge(RunningStats.fromMoments(sent - lost, (mean, m2, rtt_min, rtt_max)))
+      return
+    for index, timestamp, size, rtt, flags in wire.iterRecords(frame):
+      host = self.hosts.get(index)
+      if host is None:
+        host = self.hosts[index] = [0, 0, RunningStats(), None]
+      host[0] += 1
+      self.sent_packets += 1
+      if flags & wire.FLAG_LOST:
+        host[1] += 1
+      else:
+        self.received_packets += 1
+        if host[3] is not None:
+          self.rtt_stats.addJitter(rtt - host[3])
+        host[2].add(rtt)
+        host[3] = rtt
+        self.rtt_stats.add(rtt)
+        self.rtt_sketch.add(rtt)
+      if flags & wire.FLAG_HOST_DONE:
+        sent, lost, rtt_stats, last_rtt = self.hosts.pop(index)
+        self.done_hosts += 1
+        self.writeHost(index, timestamp, sent, lost, rtt_stats)
+    self.out.flush()
+
+  def writeHost(self, index, timestamp, sent, lost, rttStats):
+    received = sent - lost
+    row = [timestamp, self.targets[index], sent, received, lost,
+           round(lost / sent * 100, 2) if sent else 0,
+           round(rttStats.mean, 3) if received else None,
+           round(rttStats.min, 3) if received else None,
+           round(rttStats.max, 3) if received else None]
+    self.writeRow(dict(zip(HOST_FIELDS, row)), row)
+
+  def writeRow(self, record, row):
+    if self.format == "csv":
+      self.out.write(",".join("" if v is None else str(v) for v in row) + "\n")
+    else:
+      self.out.write(json.dumps(record) + "\n")
+
+  def summaryData(self):
+    return SummaryData(self.sent_packets, self.received_packets, self.rtt_stats.mean,
+                       self.rtt_stats.stddev(), self.rtt_stats.jitter(),
+                       self.rtt_sketch.quantiles([0.5, 0.95, 0.99]), self.resolve_stats.mean,
+                       self.sent_packets / self.done_hosts if self.done_hosts else 0)
+
+  def writeSummary(self, roundNumber=None):
+    """
+    roundNumber is the monitoring round that just ended, None for the final summary
+    """
+    summary = self.summaryData()
+    record = {"type": "summary", "sent": summary.sent_packets,
+              "received": summary.received_packets, "lost": summary.packets_lost,
+              "loss_percentage": round(summary.loss_percentage, 2),
+              "rtt_avg": round(summary.output_delay, 3), "rtt_stddev": round(summary.rtt_stddev, 3),
+              "jitter": round(summary.jitter, 3), "rtt_p50": round(summary.rtt_p50, 3),
+              "rtt_p95": round(summary.rtt_p95, 3), "rtt_p99": round(summary.rtt_p99, 3),
+              "resolve_avg": round(summary.resolve_time, 3),
+              "packets_per_host": round(summary.packets_per_host, 2)}
+    if self.req_data is not None: #achieved send rate over the run, and the limits asked for
+      elapsed = max(time.time() - self.start_time, 1e-3)
+      record["packet_rate"] = round(summary.sent_packets / elapsed, 1)
+      record["byte_rate"] = round(summary.sent_packets * (self.req_data.buf_size + WIRE_OVERHEAD) / elapsed, 1)
+      record["packet_rate_limit"] = self.req_data.packet_rate
+      record["byte_rate_limit"] = self.req_data.byte_rate
+    if roundNumber is not None:
+      record["type"] = "round"
+      record["round"] = roundNumber
+    self.writeRecord(record)
+
+  def writeRecord(self, record):
+    """
+    A record that isn't a host line
+    """
+    if self.format == "csv": #keep stdout a single table
+      sys.stderr.write(json.dumps(record) + "\n")
+    else:
+      self.out.write(json.dumps(record) + "\n")
+      self.out.flush()
+
+
+def runSharded(targets, reqData, printer):
+  """
+  Several worker processes, their merged frames go to the printer
+  """
+  from multiprocessing.connection import wait
+  from lib.sharded_pinger import ShardedPinger
+  pinger = ShardedPinger(targets, reqData, reqData.workers)
+  pinger.start()
+  try:
+    while not printer.finished:
+      if not pinger.poll():
+        fds = pinger.liveFilenos()
+        if fds:
+          wait(fds, timeout=0.5)
+        continue
+      printer.send_bytes(pinger.recv_bytes())
+  finally:
+    pinger.terminate()
+    pinger.join()
+
+def parseArguments(argv):
+  parser = argparse.ArgumentParser(description="Ping hosts without the gui")
+  parser.add_argument("targets", nargs="+",
+                      help="ips, ranges (10.0.0.1-10.0.2.9), CIDR blocks or hostnames")
+  parser.add_argument("-s", "--size", type=int, default=55, help="packet size in bytes")
+  parser.add_argument("-t", "--timeout", type=int, default=1000, help="timeout in ms")
+  parser.add_argument("-d", "--delay", type=int, default=1000, help="delay between packets in ms")
+  parser.add_argument("--distribution", choices=sorted(DISTRIBUTIONS), default="constant",
+                      help="delay distribution")
+  parser.add_argument("-c", "--count", type=int, default=3, help="packets per host")
+  parser.add_argument("--sweep", action="store_true",
+                      help="find the live hosts first, only they get --count packets")
+  parser.add_argument("--early-stop", action="store_true",
+                      help="stop pinging a host once its loss and rtt have converged, "
+                           "--count being the most it gets")
+  parser.add_argument("--loss-precision", type=float, default=0.1,
+                      help="early stop: half width of the loss rate's 95%% interval")
+  parser.add_argument("--rtt-precision", type=float, default=0.1,
+                      help="early stop: relative standard error of the mean rtt")
+  parser.add_argument("--concurrency", type=int, default=RequestData.DEFAULT_CONCURRENCY,
+                      help="probes in flight per worker")
+  parser.add_argument("-w", "--workers", type=int, default=1,
+                      help="worker processes, 1 pings in this process")
+  parser.add_argument("-b", "--backend", choices=sorted(BACKENDS), default="auto",
+                      help="how hosts are probed")
+  parser.add_argument("-p", "--port", type=int, default=80, help="port for the tcp backend")
+  parser.add_argument("-o", "--backend-option", action="append", default=[], metavar="NAME=VALUE",
+                      help="backend option, e.g. loss=0.05 for the fake backend")
+  parser.add_argument("--adaptive-timeout", action="store_true",
+                      help="shorten timeouts from the rtts seen, --timeout being the longest")
+  parser.add_argument("-r", "--rate", type=int, default=0,
+                      help="packets per second over all workers, 0 for no limit")
+  parser.add_argument("--byte-rate", type=int, default=0,
+                      help="bytes per second over all workers, headers included, 0 for no limit")
+  parser.add_argument("--every", type=int, default=0, metavar="SECONDS",
+                      help="monitor: start a new round every SECONDS until interrupted")
+  parser.add_argument("--window", type=int, default=900, metavar="SECONDS",
+                      help="monitor: span of the recent statistics")
+  parser.add_argument("--change-only", action="store_true",
+                      help="monitor: after the first round, only write the hosts that changed")
+  parser.add_argument("--rtt-band", type=float, default=0.25,
+                      help="change only: relative change of a host's mean rtt that gets it written")
+  parser.add_argument("--history", metavar="PATH",
+                      help="also keep every sample in this SQLite database")
+  parser.add_argument("--retention", type=float, default=30,
+                      help="history: days of samples kept")
+  parser.add_argument("--max-samples", type=int, default=RequestData.DEFAULT_HISTORY_SAMPLES,
+                      help="history: samples kept at most, the oldest go first; 0 for no limit")
+  parser.add_argument("-f", "--format", choices=["jsonl", "csv"], default="jsonl")
+  return parser.parse_args(argv)
+
+def parseBackendOptions(options):
+  """
+  NAME=VALUE strings to a dict, values read as json when they parse (numbers, true/false)
+  """
+  result = {}
+  for option in options:
+    if '=' not in option:
+      raise ValueError("Backend options look like NAME=VALUE, got %s" % option)
+    name, value = option.split('=', 1)
+    try:
+      result[name] = json.loads(value)
+    except ValueError:
+      result[name] = value
+  return result
+
+def main(argv=None):
+  args = parseArguments(argv)
+  try:
+    targets = parseTargets(",".join(args.targets))
+  except ValueError as e:
+    sys.stderr.write("%s\n" % e)
+    return 1
+  try:
+    backend_options = parseBackendOptions(args.backend_option)
+    if backend_options:
+      from lib.backends import checkBackendOptions
+      checkBackendOptions(BACKENDS[args.backend], backend_options)
+  except ValueError as e:
+    sys.stderr.write("%s\n" % e)
+    return 1
+  req_data = RequestData(args.size, args.timeout, args.delay / 1000, args.count,
+                         DISTRIBUTIONS[args.distribution], args.concurrency, args.workers,
+                         BACKENDS[args.backend], args.port, backend_options, args.rate,
+                         args.byte_rate, args.adaptive_timeout, args.sweep, args.early_stop,
+                         args.loss_precision, args.rtt_precision, args.every, args.window,
+                         args.change_only, args.rtt_band)
+  if args.history: #fail here rather than in every worker
+    import sqlite3
+    from lib.history_store import HistoryStore
+    max_samples = args.max_samples or None
+    try:
+      HistoryStore(args.history, args.retention * 86400, max_samples).close()
+    except (sqlite3.Error, OSError) as e:
+      sys.stderr.write("Can't open the history %s: %s\n" % (args.history, e))
+      return 1
+    req_data.history_path = args.history
+    req_data.history_retention = args.retention * 86400
+    req_data.history_max_samples = max_samples
+  printer = ResultPrinter(targets, args.format, reqData=req_data)
+  try:
+    if args.workers > 1:
+      runSharded(targets, req_data, printer)
+    else:
+      from lib.pinger import Pinger
+      Pinger(targets, req_data, printer).run()
+  except KeyboardInterrupt:
+    pass
+  except socket.error as e: #the backend couldn't open its socket
+    sys.stderr.write("Can't probe with the %s backend: %s\n" % (args.backend, e))
+    return 1
+  printer.writeSummary()
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,167 @@
+"""
+Probe backends the Pinger can send its packets through.
+A backend is opened on the pinger's event loop, probed with
+  await backend.probe(ip, size, timeout)
+which returns the rtt in ms or None for a lost packet, and closed at the end
+of the run. createBackend picks one from RequestData.backend.
+Backends taking options (RequestData.backend_options) list their names in
+OPTIONS, checkBackendOptions rejects anything else.
+"""
+from __future__ import division
+import socket, time, random, zlib, asyncio
+from lib.icmp import IcmpProber, parseEchoReply
+from lib.util import RequestData, isAdminCurrent
+
+class ProbeBackend(object):
+  """
+  Base class, see the module docstring
+  """
+  NEEDS_ADDRESS = True #hostnames are resolved before probing
+  OPTIONS = () #keyword arguments the backend takes from RequestData.backend_options
+  def open(self, loop):
+    self.loop = loop
+
+  def close(self):
+    pass
+
+  async def probe(self, ip, size, timeout):
+    raise NotImplementedError
+
+
+class RawIcmpBackend(IcmpProber, ProbeBackend):
+  """
+  Raw icmp socket shared by all probes, needs admin rights
+  """
+  def __init__(self):
+    super(RawIcmpBackend, self).__init__(socket.SOCK_RAW)
+
+
+class DatagramIcmpBackend(IcmpProber, ProbeBackend):
+  """
+  Unprivileged icmp ("ping sockets", allowed through net.ipv4.ping_group_range
+  on linux, and on macOS). The kernel picks the echo identifier itself and
+  only hands this socket its own replies, so they're matched on the
+  sequence number alone.
+  """
+  def __init__(self):
+    super(DatagramIcmpBackend, self).__init__(socket.SOCK_DGRAM)
+
+  def matchReply(self, packet, addr):
+    #linux strips the ip header on these sockets, macOS doesn't
+    return parseEchoReply(packet, packet[0] >> 4 == 4)
+
+
+class TcpConnectBackend(ProbeBackend):
+  """
+  Reachability through a tcp connect to a port. The rtt is the handshake
+  time; a refused connection still means the host answered. A half open
+  SYN scan would need a raw socket, which is what this backend avoids.
+  """
+  def __init__(self, port):
+    super(TcpConnectBackend, self).__init__()
+    self.port = port
+
+  async def probe(self, ip, size, timeout):
+    start = time.perf_counter()
+    try:
+      reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, self.port),
+                                              timeout / 1000)
+    except ConnectionRefusedError: #a RST came back, the host is up
+      return (time.perf_counter() - start) * 1000
+    except (asyncio.TimeoutError, socket.error):
+      return None
+    rtt = (time.perf_counter() - start) * 1000
+    writer.close()
+    return rtt
+
+
+class FakeBackend(ProbeBackend):
+  """
+  No network at all, for load testing the whole pipeline at high rates.
+  Options (RequestData.backend_options):
+    dead     -- fraction of hosts that never answer, picked from the ip so
+                it's the same hosts on every run (default 0.2)
+    loss     -- chance of losing a packet to a live host (default 0.01)
+    rtt      -- mean rtt in ms (default 20)
+    jitter   -- rtt standard deviation in ms (default 5)
+    seed     -- seed of the rtt/loss random stream (default 0)
+    realtime -- actually wait the rtt/timeout, off to go as fast as possible
+                (default True)
+  """
+  NEEDS_ADDRESS = False
+  OPTIONS = ("dead", "loss", "rtt", "jitter", "seed", "realtime")
+  def __init__(self, dead=0.2, loss=0.01, rtt=20.0, jitter=5.0, seed=0, realtime=True):
+    super(FakeBackend, self).__init__()
+    self.dead = dead
+    self.loss = loss
+    self.rtt = rtt
+    self.jitter = jitter
+    self.seed = seed
+    self.realtime = realtime
+    self.random = random.Random(seed)
+
+  def isDead(self, ip):
+    key = zlib.crc32(("%s:%s" % (self.seed, ip)).encode()) & 0xffffffff
+    return key < self.dead * 0x100000000
+
+  async def probe(self, ip, size, timeout):
+    if self.isDead(ip) or self.random.random() < self.loss:
+      if self.realtime:
+        await asyncio.sleep(timeout / 1000)
+      return None
+    rtt = max(0.01, self.random.gauss(self.rtt, self.jitter))
+    if rtt > timeout:
+      rtt = None
+    if self.realtime:
+      await asyncio.sleep((rtt if rtt is not None else timeout) / 1000)
+    return rtt
+
+
+BACKEND_CLASSES = {RequestData.BACKEND_RAW_ICMP: RawIcmpBackend,
+                   RequestData.BACKEND_DGRAM_ICMP: DatagramIcmpBackend,
+                   RequestData.BACKEND_TCP: TcpConnectBackend,
+                   RequestData.BACKEND_FAKE: FakeBackend}
+
+def checkBackendOptions(kind, options):
+  """
+  Raises ValueError when options has names the backend kind doesn't take;
+  the automatic choice takes none
+  """
+  backend_class = BACKEND_CLASSES.get(kind, ProbeBackend)
+  unknown = sorted(set(options) - set(backend_class.OPTIONS))
+  if unknown:
+    if backend_class.OPTIONS:
+      raise ValueError("Unknown backend option %s, %s takes %s" %
+                       (", ".join(unknown), backend_class.__name__, ", ".join(backend_class.OPTIONS)))
+    raise ValueError("Unknown backend option %s, this backend takes no options" %
+                     ", ".join(unknown))
+
+def createBackend(reqData, loop):
+  """
+  The backend reqData asks for, opened on loop
+  """
+  kind = reqData.backend
+  checkBackendOptions(kind, reqData.backend_options)
+  if kind == RequestData.BACKEND_AUTO:
+    candidates = [RawIcmpBackend, DatagramIcmpBackend] if isAdminCurrent() else [DatagramIcmpBackend]
+    for candidate in candidates:
+      backend = candidate()
+      try:
+        backend.open(loop)
+        return backend
+      except socket.error as e: #not allowed here, try the next one
+        error = e
+    raise socket.error(error.errno, "no icmp socket can be opened (%s), run as admin or allow "
+                       "unprivileged ping (net.ipv4.ping_group_range on linux)" % error.strerror)
+  elif kind == RequestData.BACKEND_RAW_ICMP:
+    backend = RawIcmpBackend()
+  elif kind == RequestData.BACKEND_DGRAM_ICMP:
+    backend = DatagramIcmpBackend()
+  elif kind == RequestData.BACKEND_TCP:
+    backend = TcpConnectBackend(reqData.port)
+  elif kind == RequestData.BACKEND_FAKE:
+    backend = FakeBackend(**reqData.backend_options)
+  else:
+    raise ValueError("Unknown probe backend %s" % kind)
+  backend.open(loop)
+  return backend
@@ -0,0 +1,85 @@
+"""
+Change-only reporting for pingers running rounds: a host's records only go
+down the pipe when its state changed since the last round that was sent.
+"""
+from __future__ import division
+from lib import wire
+from lib.stats import RunningStats
+
+class ChangeFilter(object):
+  """
+  Stands in for a FrameWriter (same write()) and holds every host's records
+  back until its last packet of the round is in. The round's records are
+  then written as usual if the host
+    - became reachable or unreachable (a reply or none at all),
+    - started or stopped losing packets, which is what the leds show,
+    - or has a mean rtt more than rttBand (a fraction) away from the one
+      last reported,
+  or when it's the host's first round. Flipped reachability also makes a
+  FRAME_TRANSITION record. The counts of the hosts held back are summed up
+  and written as a FRAME_TOTALS record by endRound(), so totals add up on
+  the other end; their rtt percentiles and jitter are lost.
+  Held back records are bounded by the hosts in flight, the state kept is
+  a list per host.
+  """
+  def __init__(self, writer, rttBand=0.25):
+    super(ChangeFilter, self).__init__()
+    self.writer = writer
+    self.rtt_band = rttBand
+    self._pending = {} #index -> records of the round so far
+    self._states = {} #index -> [reachable, lossy, rtt last reported]
+    self._resetTotals()
+
+  def _resetTotals(self):
+    self.held_hosts = 0
+    self.held_sent = 0
+    self.held_lost = 0
+    self.held_rtts = RunningStats()
+
+  def write(self, index, size, rtt, flags=0, timestamp=None):
+    if timestamp is None:
+      timestamp = wire.now()
+    records = self._pending.get(index)
+    if records is None:
+      records = self._pending[index] = []
+    records.append((size, rtt, flags, timestamp))
+    if flags & wire.FLAG_HOST_DONE:
+      self.hostDone(index, self._pending.pop(index))
+
+  def writeResolve(self, index, ms):
+    self.writer.writeResolve(index, ms)
+
+  def hostDone(self, index, records):
+    lost = sum(1 for size, rtt, flags, timestamp in records if flags & wire.FLAG_LOST)
+    received = len(records) - lost
+    rtt = sum(r[1] for r in records if not r[2] & wire.FLAG_LOST) / received if received else 0
+    state = self._states.get(index)
+    if state is not None and self.unchanged(state, received, lost, rtt):
+      self.held_hosts += 1
+      self.held_sent += len(records)
+      self.held_lost += lost
+      for size, rtt, flags, timestamp in records:
+        if not flags & wire.FLAG_LOST:
+          self.held_rtts.add(rtt)
+      return
+    if state is not None and state[0] != bool(received):
+      self.writer.writeTransition(index, records[-1][3],
+                                  wire.TRANSITION_UP if received else wire.TRANSITION_DOWN)
+    self._states[index] = [bool(received), bool(lost), rtt]
+    for size, rtt, flags, timestamp in records:
+      self.writer.write(index, size, rtt, flags, timestamp)
+
+  def unchanged(self, state, received, lost, rtt):
+    reachable, lossy, last_rtt = state
+    if reachable != bool(received) or lossy != bool(lost):
+      return False
+    return not received or abs(rtt - last_rtt) <= self.rtt_band * last_rtt
+
+  def endRound(self):
+    """
+    Write the totals of the hosts held back since the last call
+    """
+    if self.held_hosts:
+      self.writer.writeTotals(self.held_hosts, self.held_sent, self.held_lost,
+                              self.held_rtts.moments())
+    self._resetTotals()
@@ -0,0 +1,55 @@
+"""
+Inter packet delays drawn from the distribution RequestData asks for.
+"""
+from lib.util import RequestData
+
+class DelaySampler(object):
+  """
+  Hands out delays (in seconds) one at a time, drawing them from numpy in
+  batches of batchSize, so the per packet cost is an index bump rather than
+  a numpy call. Every sampler has a generator of its own, seeded from the
+  os unless seed is given, so forked workers don't all replay the same
+  sequence. Delays are never negative (a gaussian around a small delay
+  would otherwise ask to send in the past).
+  The distributions keep their historical parameters: gaussian has the
+  delay as mean and a 1 s standard deviation, poisson and exponential the
+  delay as mean, and uniform spans 0 to delay.
+  """
+  def __init__(self, reqData, batchSize=4096, seed=None):
+    super(DelaySampler, self).__init__()
+    self.distribution = reqData.distribution
+    self.delay = reqData.delay
+    self.batch_size = batchSize
+    self.seed = seed
+    self._generator = None
+    self._batch = []
+    self._position = 0
+
+  def draw(self, count):
+    """
+    count new delays as a numpy array
+    """
+    import numpy as np
+    if self._generator is None:
+      self._generator = np.random.default_rng(self.seed)
+    if self.distribution == RequestData.DISTRIBUTION_UNIFORM:
+      delays = self._generator.uniform(0, self.delay, count)
+    elif self.distribution == RequestData.DISTRIBUTION_GAUSSIAN:
+      delays = self._generator.normal(self.delay, 1.0, count)
+    elif self.distribution == RequestData.DISTRIBUTION_POISSON:
+      delays = self._generator.poisson(self.delay, count).astype(float)
+    elif self.distribution == RequestData.DISTRIBUTION_EXPONENTIAL:
+      delays = self._generator.exponential(self.delay, count)
+    else:
+      raise ValueError("Unknown delay distribution %s" % self.distribution)
+    return np.maximum(delays, 0)
+
+  def next(self):
+    if self.distribution == RequestData.DISTRIBUTION_CONSTANT:
+      return self.delay
+    if self._position >= len(self._batch):
+      self._batch = self.draw(self.batch_size).tolist()
+      self._position = 0
+    delay = self._batch[self._position]
+    self._position += 1
+    return delay
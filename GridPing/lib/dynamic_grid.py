@@ -1,7 +1,8 @@
 from __future__ import division
-from PySide.QtGui import *
-from PySide.QtCore import *
-import sys, math
+from PySide6.QtWidgets import *
+from PySide6.QtGui import *
+from PySide6.QtCore import *
+import sys
 from lib.indicator_ball import BallWidget
 
 
@@ -15,6 +16,7 @@ class GridWidget(QWidget):
     """
     super(GridWidget, self).__init__(parent)
     self._widgets = []
+    self._positions = [] #(row, col) of each widget in the grid layout
     self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
     self.ww = widgetWidth
     self.wh = widgetHeight
@@ -29,6 +31,7 @@ class GridWidget(QWidget):
     widget.setFixedWidth(self.ww)
     widget.setFixedHeight(self.wh)
     self._widgets.append(widget)
+    self._positions.append(None) #not in the grid yet, placed on the next resize
     
   def widgets(self):
     return self._widgets
@@ -38,57 +41,33 @@ class GridWidget(QWidget):
       self.grid.removeWidget(widget)
       widget.deleteLater()
     self._widgets = []
+    self._positions = []
+    self.widgets_in_row = 0
+
+  def columnsForWidth(self, w):
+    """
+    The number of widgets (plus their spacing) that fit in a row of width w
+    """
+    n = w // (self.ww + self.ls)
+    return max(1, min(n, len(self._widgets)))
 
   def resizeEvent(self, re):
     if not len(self._widgets):
       return #no widgets, don't do anything (eliminates a division by zero error)
     #recalculate rows based on current width
-    w = self.width()
-    #get the number of widgets that can be inserted per row
-    hor_distance = 0
-    n = 0 #the number of widgets that can be inserted in a row
-    while hor_distance < w:
-      hor_distance += self.ww
-      hor_distance += self.ls
-      n += 1
-    if hor_distance > w:
-      n -= 1
-    n = min(n, len(self._widgets))
+    n = self.columnsForWidth(self.width())
+    if n == self.widgets_in_row and self._positions[-1] is not None:
+      return #same columns and every widget placed, the layout is still right
     self.widgets_in_row = n
-    if self.grid.rowCount():
-      for widget in self._widgets: #remove all widgets
-        self.grid.removeWidget(widget)
-      self.grid.update()
-    row = 0; col = 0;
-    grid_row_count = int(math.ceil(len(self._widgets) / n)) #might leave the last row incomplete
-    widget_grid = self.redimArray(self._widgets, grid_row_count, n)
-    #insert the widgets
-    for widget_row in widget_grid:
-      for widget in widget_row:
-        self.grid.addWidget(widget, row, col)
-        col += 1
-      row += 1
-      col = 0
+    #only move the widgets whose cell changed
+    for i, widget in enumerate(self._widgets):
+      position = divmod(i, n)
+      if self._positions[i] != position:
+        if self._positions[i] is not None:
+          self.grid.removeWidget(widget)
+        self.grid.addWidget(widget, position[0], position[1])
+        self._positions[i] = position
 
-  def redimArray(self, array, rows, cols):
-    """array is a flat list"""
-    #this function is available in numpy, but I don't want to introduce
-    #another dependency
-    complete_rows = rows
-    if rows * cols > len(array):
-      complete_rows = int(math.floor(len(array) / cols))
-    res = []
-    for irow in range(complete_rows):
-      row = []
-      for icol in range(cols):
-        row.append(array[irow*cols+icol])
-      res.append(row)
-    if complete_rows < rows: #add the last incomplete row
-      start_index = complete_rows * cols
-      last_row = array[start_index:]
-      res.append(last_row)
-    return res
-  
   def setStateAt(self, i, state):
     self._widgets[i].state = state
   
@@ -151,4 +130,4 @@ if __name__ == "__main__":
   window.layoutForIps(ips)
   window.setMinimumSize(100, 100)
   window.show()
-  sys.exit(app.exec_())
+  sys.exit(app.exec())
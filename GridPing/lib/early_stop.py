@@ -0,0 +1,76 @@
+"""
+Sequential stopping rule for the per host measurement: stop probing a host
+once its loss rate and rtt are known well enough.
+"""
+from __future__ import division
+import math
+
+def wilsonInterval(lost, sent, z=1.96):
+  """
+  Wilson score interval (low, high) of a loss rate, 95% with the default z.
+  Unlike the normal approximation it behaves at 0/n and n/n.
+  """
+  if not sent:
+    return 0.0, 1.0
+  p = lost / sent
+  z2 = z * z
+  denominator = 1 + z2 / sent
+  center = (p + z2 / (2 * sent)) / denominator
+  half = z * math.sqrt(p * (1 - p) / sent + z2 / (4 * sent * sent)) / denominator
+  return max(0.0, center - half), min(1.0, center + half)
+
+
+class ConvergenceTest(object):
+  """
+  Tracks every host's loss and rtt as its packets come in, and tells when
+  both have converged:
+    - the half width of the loss rate's Wilson interval is at most
+      lossPrecision (0.1 is +-10 points)
+    - the relative standard error of the mean rtt is at most rttPrecision,
+      from at least two replies (hosts that never answered have no rtt to
+      pin down, the loss rate decides alone)
+  and the host got at least minPackets. The caller keeps the packet count
+  cap. State is dropped with forget() once a host is done.
+  """
+  def __init__(self, lossPrecision=0.1, rttPrecision=0.1, minPackets=5, z=1.96):
+    super(ConvergenceTest, self).__init__()
+    self.loss_precision = lossPrecision
+    self.rtt_precision = rttPrecision
+    self.min_packets = minPackets
+    self.z = z
+    self._hosts = {} #index -> [sent, lost, replies, rtt mean, rtt m2]
+
+  def add(self, index, rtt):
+    """
+    rtt is None for a lost packet
+    """
+    host = self._hosts.get(index)
+    if host is None:
+      host = self._hosts[index] = [0, 0, 0, 0.0, 0.0]
+    host[0] += 1
+    if rtt is None:
+      host[1] += 1
+      return
+    host[2] += 1
+    delta = rtt - host[3]
+    host[3] += delta / host[2]
+    host[4] += delta * (rtt - host[3])
+
+  def converged(self, index):
+    sent, lost, replies, mean, m2 = self._hosts.get(index, (0, 0, 0, 0.0, 0.0))
+    if sent < self.min_packets:
+      return False
+    low, high = wilsonInterval(lost, sent, self.z)
+    if (high - low) / 2 > self.loss_precision:
+      return False
+    if not replies:
+      return True
+    if replies < 2:
+      return False
+    if mean <= 0:
+      return True
+    standard_error = math.sqrt(m2 / (replies - 1) / replies)
+    return standard_error / mean <= self.rtt_precision
+
+  def forget(self, index):
+    self._hosts.pop(index, None)
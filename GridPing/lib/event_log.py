@@ -0,0 +1,103 @@
+from PySide6.QtWidgets import *
+from PySide6.QtGui import *
+from PySide6.QtCore import *
+import sys
+from collections import deque
+from lib import wire
+from lib.util import formatTimestamp
+
+
+class EventLogModel(QAbstractListModel):
+  """
+  The hosts that went up or down (FRAME_TRANSITION records), oldest first.
+  Keeps the last `capacity` events; like OutputLogModel, new events reach
+  the view on flush(), as one row insertion (and removal) per batch.
+  """
+  UP_COLOR = QColor(40, 150, 40)
+  DOWN_COLOR = QColor(200, 40, 40)
+
+  def __init__(self, capacity=10000, parent=None):
+    super(EventLogModel, self).__init__(parent)
+    self.capacity = capacity
+    self.ips = []
+    self.events = deque(maxlen=capacity) #(index, timestamp, state)
+    self._end = 0 #events ever appended
+    self._shown = 0 #rows the view knows about
+    self._first = 0 #oldest event kept at the last flush
+
+  def setIps(self, ips):
+    self.beginResetModel()
+    self.ips = ips
+    self.events.clear()
+    self._end = self._shown = self._first = 0
+    self.endResetModel()
+
+  def append(self, index, timestamp, state):
+    self.events.append((index, timestamp, state))
+    self._end += 1
+
+  def flush(self):
+    first = self._end - len(self.events)
+    dropped = min(first - self._first, self._shown)
+    self._first = first
+    if dropped:
+      self.beginRemoveRows(QModelIndex(), 0, dropped - 1)
+      self._shown -= dropped
+      self.endRemoveRows()
+    added = len(self.events) - self._shown
+    if added > 0:
+      self.beginInsertRows(QModelIndex(), self._shown, self._shown + added - 1)
+      self._shown += added
+      self.endInsertRows()
+
+  def rowCount(self, parent=QModelIndex()):
+    if parent.isValid():
+      return 0
+    return self._shown
+
+  def data(self, index, role=Qt.DisplayRole):
+    if not index.isValid() or index.row() >= self._shown:
+      return None
+    host, timestamp, state = self.events[index.row()]
+    if role == Qt.DisplayRole:
+      return "%s  %s went %s" % (formatTimestamp(timestamp), self.ips[host],
+                                 "up" if state == wire.TRANSITION_UP else "down")
+    if role == Qt.ForegroundRole:
+      return self.UP_COLOR if state == wire.TRANSITION_UP else self.DOWN_COLOR
+    return None
+
+
+class EventLogView(QListView):
+  """
+  The events tab, follows the newest event while scrolled to the bottom
+  """
+  def __init__(self, parent=None):
+    super(EventLogView, self).__init__(parent)
+    self.model = EventLogModel()
+    self.setUniformItemSizes(True)
+    self.setModel(self.model)
+    self.setSelectionMode(QAbstractItemView.ExtendedSelection)
+
+  def setIps(self, ips):
+    self.model.setIps(ips)
+
+  def append(self, index, timestamp, state):
+    self.model.append(index, timestamp, state)
+
+  def flush(self):
+    scroll_bar = self.verticalScrollBar()
+    following = scroll_bar.value() == scroll_bar.maximum()
+    self.model.flush()
+    if following:
+      self.scrollToBottom()
+
+if __name__ == "__main__":
+  app = QApplication(sys.argv)
+  window = EventLogView()
+  ips = ["10.0.0.%d" % i for i in range(256)]
+  window.setIps(ips)
+  for i in range(len(ips)):
+    window.append(i, 1500000000000 + i * 1000, i % 2)
+  window.flush()
+  window.show()
+  sys.exit(app.exec())
@@ -0,0 +1,223 @@
+"""
+Durable history of every probe sample, in an SQLite database in WAL mode.
+"""
+from __future__ import division
+import os, time, queue, sqlite3, threading
+from lib import wire
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hosts (
+  id INTEGER PRIMARY KEY,
+  address TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS samples (
+  ts INTEGER NOT NULL, --ms since the epoch
+  host INTEGER NOT NULL REFERENCES hosts(id),
+  rtt REAL --ms, NULL for a lost packet
+);
+CREATE INDEX IF NOT EXISTS samples_ts ON samples (ts);
+CREATE INDEX IF NOT EXISTS samples_host_ts ON samples (host, ts);
+"""
+
+def defaultPath():
+  return os.path.join(os.path.expanduser("~"), ".gridping", "history.db")
+
+
+class HistoryStore(object):
+  """
+  Keeps every packet record (host, timestamp, rtt) across runs, so results
+  outlive the window. Frames are handed over as they are (appendFrame, or
+  send_bytes so a FrameWriter can write to the store) and a writer thread,
+  which owns the write connection, decodes and inserts them in batches, one
+  transaction per batch; the pinger never waits on the disk. The pingers
+  write to the store themselves, several worker processes can share one
+  database (their transactions take turns).
+  Hosts are stored once in the hosts table, samples refer to them by id;
+  a host's address is only looked up when its first record comes in.
+  The (ts) and (host, ts) indexes serve the queries over a time range,
+  for all hosts or one. Queries run on a connection of their own, WAL lets
+  them read while the writer writes.
+  Every COMPACT_INTERVAL the writer deletes the samples older than
+  `retention` seconds and, with maxSamples, the oldest ones past that many,
+  then gives the freed pages back to the file system.
+  """
+  BATCH_FRAMES = 64 #frames inserted per transaction at most
+  COMPACT_INTERVAL = 300 #seconds
+  DELETE_CHUNK = 100000 #rows deleted per statement, so readers aren't locked out for long
+
+  def __init__(self, path=None, retention=30 * 86400, maxSamples=None):
+    super(HistoryStore, self).__init__()
+    self.path = path or defaultPath()
+    self.retention = retention
+    self.max_samples = maxSamples
+    self.error = None #last error of the writer thread, its batch was dropped
+    directory = os.path.dirname(os.path.abspath(self.path))
+    if not os.path.isdir(directory):
+      os.makedirs(directory)
+    connection = sqlite3.connect(self.path)
+    #only takes on a new database, before it's switched to WAL
+    connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    connection.executescript(SCHEMA)
+    connection.close()
+    self._reader = None
+    self._queue = queue.Queue()
+    self._thread = threading.Thread(target=self._write, name="history writer")
+    self._thread.daemon = True
+    self._thread.start()
+
+  def connect(self):
+    connection = sqlite3.connect(self.path, timeout=30)
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.execute("PRAGMA synchronous = NORMAL") #durable up to the last checkpoint, plenty for a history
+    return connection
+
+  def setHosts(self, ips, indices=None):
+    """
+    The hosts the records' indices refer to from now on, call it at the
+    start of every run. indices are the ones reported for ips, for
+    pingers handling a shard of a bigger list; positions by default.
+    Both are kept as they are and read from the writer thread, only for the
+    hosts records come in for, so a TargetSet or TargetView and a range
+    (whose index() is cheap) never get expanded.
+    """
+    self._queue.put(("hosts", (ips, indices)))
+
+  def appendFrame(self, frame):
+    if wire.frameType(frame) == wire.FRAME_RECORDS:
+      self._queue.put(("frame", frame))
+
+  send_bytes = appendFrame
+
+  def flush(self):
+    """
+    Wait until everything handed over so far is written
+    """
+    self._queue.join()
+
+  def close(self):
+    self._queue.put(("close", None))
+    self._thread.join()
+    if self._reader is not None:
+      self._reader.close()
+      self._reader = None
+
+  def _write(self):
+    connection = self.connect()
+    hosts = ([], None)
+    host_ids = {} #record index -> host id, of the hosts seen so far
+    next_compaction = time.time() + self.COMPACT_INTERVAL
+    try:
+      while True:
+        messages = [self._queue.get()]
+        try:
+          while len(messages) < self.BATCH_FRAMES:
+            messages.append(self._queue.get_nowait())
+        except queue.Empty:
+          pass
+        closing = False
+        try:
+          with connection: #one transaction for the batch
+            frames = []
+            for kind, payload in messages:
+              if kind == "frame":
+                frames.append(payload)
+                continue
+              self._insertSamples(connection, frames, hosts, host_ids) #records before the hosts changed
+              frames = []
+              if kind == "hosts":
+                hosts = payload
+                host_ids = {}
+              elif kind == "close":
+                closing = True
+            self._insertSamples(connection, frames, hosts, host_ids)
+          if closing or time.time() >= next_compaction:
+            next_compaction = time.time() + self.COMPACT_INTERVAL
+            self.compact(connection)
+        except (sqlite3.Error, LookupError, ValueError) as e: #records of hosts never set
+          self.error = e
+        finally:
+          for message in messages:
+            self._queue.task_done()
+        if closing:
+          return
+    finally:
+      connection.close()
+
+  def _addHosts(self, connection, hosts, hostIds, indices):
+    """
+    Find the ids of the hosts behind record indices met for the first time,
+    adding the hosts never stored before, into hostIds
+    """
+    ips, positions = hosts
+    addresses = [(index, ips[index if positions is None else positions.index(index)])
+                 for index in indices]
+    connection.executemany("INSERT OR IGNORE INTO hosts (address) VALUES (?)",
+                           ((address,) for index, address in addresses))
+    for index, address in addresses:
+      hostIds[index] = connection.execute("SELECT id FROM hosts WHERE address = ?",
+                                          (address,)).fetchone()[0]
+
+  def _insertSamples(self, connection, frames, hosts, hostIds):
+    if not frames:
+      return
+    samples = [(index, timestamp, None if flags & wire.FLAG_LOST else rtt)
+               for frame in frames
+               for index, timestamp, size, rtt, flags in wire.iterRecords(frame)]
+    new = set(index for index, timestamp, rtt in samples if index not in hostIds)
+    if new:
+      self._addHosts(connection, hosts, hostIds, new)
+    connection.executemany("INSERT INTO samples (ts, host, rtt) VALUES (?, ?, ?)",
+                           ((timestamp, hostIds[index], rtt) for index, timestamp, rtt in samples))
+
+  def compact(self, connection):
+    """
+    Apply the retention policy, on the writer's connection
+    """
+    cutoff = wire.now() - self.retention * 1000
+    self._deleteWhile(connection, "ts < ?", (cutoff,))
+    if self.max_samples is not None:
+      #rowids only grow, the newest max_samples are the ones close to the largest
+      last = connection.execute("SELECT max(rowid) FROM samples").fetchone()[0] or 0
+      self._deleteWhile(connection, "rowid <= ?", (last - self.max_samples,))
+    #frees a page per step, and execute() only steps once
+    connection.executescript("PRAGMA incremental_vacuum;")
+    connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+  def _deleteWhile(self, connection, condition, parameters):
+    while True:
+      with connection:
+        deleted = connection.execute("DELETE FROM samples WHERE rowid IN "
+                                     "(SELECT rowid FROM samples WHERE %s LIMIT %d)" %
+                                     (condition, self.DELETE_CHUNK), parameters).rowcount
+      if deleted < self.DELETE_CHUNK:
+        return
+
+  def reader(self):
+    """
+    The query connection, made by (and only for) the thread asking first
+    """
+    if self._reader is None:
+      self._reader = self.connect()
+    return self._reader
+
+  def hostHistory(self, address, start=0, end=None):
+    """
+    [(timestamp, rtt or None when lost)] of a host between two ms timestamps
+    """
+    return self.reader().execute(
+      "SELECT ts, rtt FROM samples WHERE host = (SELECT id FROM hosts WHERE address = ?) "
+      "AND ts >= ? AND ts < ? ORDER BY ts",
+      (address, start, end if end is not None else wire.now() + 1)).fetchall()
+
+  def hostSummaries(self, start=0, end=None):
+    """
+    [(address, sent, lost, mean rtt or None)] per host seen between two ms timestamps
+    """
+    return self.reader().execute(
+      "SELECT address, count(*), count(*) - count(rtt), avg(rtt) FROM samples "
+      "JOIN hosts ON hosts.id = samples.host WHERE ts >= ? AND ts < ? "
+      "GROUP BY host ORDER BY address",
+      (start, end if end is not None else wire.now() + 1)).fetchall()
+
+  def sampleCount(self):
+    return self.reader().execute("SELECT count(*) FROM samples").fetchone()[0]
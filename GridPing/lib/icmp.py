@@ -0,0 +1,131 @@
+"""
+ICMP echo over a single long lived socket.
+Every request gets a sequence number, replies are matched back to the
+waiting probe from one receive callback on the event loop, so thousands of
+probes can share the socket without any per packet setup.
+"""
+import os, socket, struct, time, asyncio
+
+ICMP_ECHO_REPLY = 0
+ICMP_ECHO_REQUEST = 8
+ICMP_HEADER = struct.Struct("!BBHHH") #type, code, checksum, identifier, sequence
+
+def checksum(data):
+  if len(data) % 2:
+    data += b'\0'
+  total = sum(struct.unpack("!%dH" % (len(data) // 2), data))
+  total = (total >> 16) + (total & 0xffff)
+  total += total >> 16
+  return ~total & 0xffff
+
+def echoRequest(identifier, sequence, size):
+  payload = (b"GridPing" * (size // 8 + 1))[:size]
+  header = ICMP_HEADER.pack(ICMP_ECHO_REQUEST, 0, 0, identifier, sequence)
+  return ICMP_HEADER.pack(ICMP_ECHO_REQUEST, 0, checksum(header + payload),
+                          identifier, sequence) + payload
+
+def parseEchoReply(packet, hasIpHeader=True):
+  """
+  Returns (identifier, sequence) of an echo reply, None for any other packet.
+  Raw sockets hand us the ip header too, datagram ones don't.
+  """
+  offset = (packet[0] & 0x0f) * 4 if hasIpHeader else 0
+  if len(packet) < offset + ICMP_HEADER.size:
+    return None
+  icmp_type, code, _, identifier, sequence = ICMP_HEADER.unpack_from(packet, offset)
+  if icmp_type != ICMP_ECHO_REPLY:
+    return None
+  return identifier, sequence
+
+
+class IcmpProber(object):
+  """
+  Sends echo requests through one socket that stays open for the whole scan.
+  Requests are tagged with this process' identifier and a sequence number,
+  and a single reader on the event loop resolves the probe waiting on that
+  sequence number. Opening a raw socket needs admin rights.
+  """
+  MAX_PACKET = 65535
+
+  def __init__(self, socketType=socket.SOCK_RAW):
+    super(IcmpProber, self).__init__()
+    self.socket_type = socketType
+    self.identifier = os.getpid() & 0xffff
+    self._sequence = 0
+    self._pending = {} #sequence -> (future, ip, send time)
+    self._socket = None
+    self._loop = None
+
+  def open(self, loop):
+    self._loop = loop
+    self._socket = socket.socket(socket.AF_INET, self.socket_type, socket.IPPROTO_ICMP)
+    self._socket.setblocking(False)
+    loop.add_reader(self._socket.fileno(), self._onReadable)
+
+  def close(self):
+    if self._socket is not None:
+      self._loop.remove_reader(self._socket.fileno())
+      self._socket.close()
+      self._socket = None
+    for future, ip, sent in self._pending.values():
+      if not future.done():
+        future.cancel()
+    self._pending.clear()
+
+  def nextSequence(self):
+    #skip numbers still waiting for a reply, in case the 16 bits wrap around
+    while True:
+      self._sequence = (self._sequence + 1) & 0xffff
+      if self._sequence not in self._pending:
+        return self._sequence
+
+  def matchReply(self, packet, addr):
+    """
+    The (identifier, sequence) the reply should be matched on, None to drop it
+    """
+    reply = parseEchoReply(packet, self.socket_type == socket.SOCK_RAW)
+    if reply is None or reply[0] != self.identifier:
+      return None #somebody else's ping, raw sockets see every icmp packet
+    return reply
+
+  async def probe(self, ip, size, timeout):
+    """
+    Send an echo request to ip (an address, not a hostname) and wait for
+    the reply. Returns the rtt in ms, None if nothing came back within
+    timeout ms.
+    """
+    sequence = self.nextSequence()
+    future = self._loop.create_future()
+    packet = echoRequest(self.identifier, sequence, size)
+    try:
+      while True:
+        try:
+          self._socket.sendto(packet, (ip, 0))
+          break
+        except BlockingIOError: #send buffer full, let the reader drain a bit
+          await asyncio.sleep(0)
+      self._pending[sequence] = (future, ip, time.perf_counter())
+      return await asyncio.wait_for(future, timeout / 1000)
+    except asyncio.TimeoutError:
+      return None
+    finally:
+      self._pending.pop(sequence, None)
+
+  def _onReadable(self):
+    while True:
+      try:
+        packet, addr = self._socket.recvfrom(self.MAX_PACKET)
+      except (BlockingIOError, InterruptedError):
+        return
+      except socket.error: #e.g. an icmp error queued on the socket, try again next time
+        return
+      received = time.perf_counter()
+      reply = self.matchReply(packet, addr)
+      if reply is None:
+        continue
+      entry = self._pending.get(reply[1])
+      if entry is None:
+        continue #timed out already
+      future, ip, sent = entry
+      if addr[0] == ip and not future.done():
+        future.set_result((received - sent) * 1000)
@@ -1,5 +1,6 @@
-from PySide.QtCore import *
-from PySide.QtGui import *
+from PySide6.QtWidgets import *
+from PySide6.QtGui import *
+from PySide6.QtCore import *
 import sys
 
 class BallWidget(QWidget):
@@ -7,6 +8,11 @@ class BallWidget(QWidget):
   REACHABLE = 1
   UNREACHABLE = 2
   INACTIVE = 3
+  STATE_NAMES = {PENDING: "Pending", REACHABLE: "Ok", UNREACHABLE: "Unreachable",
+                 INACTIVE: "Cancelled"}
+  STATE_COLORS = {PENDING: Qt.yellow, REACHABLE: Qt.green, UNREACHABLE: Qt.red,
+                  INACTIVE: Qt.black}
+  _pixmaps = {} #(width, height, state, mouse over) -> QPixmap
   def __init__(self, ip, parent=None):
     """
     ip -- string that indicates the ip to display as a tooltip
@@ -25,51 +31,48 @@ class BallWidget(QWidget):
   def mouseMoveEvent(self, me):
     if not self.mouse_over:
       self.mouse_over = True
-      self.repaint()
+      self.update()
     
   def leaveEvent(self, le):
     self.mouse_over = False
-    self.repaint()
+    self.update()
+
+  @classmethod
+  def statePixmap(cls, w, h, state, mouseOver):
+    """
+    The ball for a state, rendered once per size and hover state and shared
+    by every ball (and the led grid) after that
+    """
+    key = (w, h, state, mouseOver)
+    pixmap = cls._pixmaps.get(key)
+    if pixmap is None:
+      pixmap = QPixmap(w, h)
+      pixmap.fill(Qt.transparent)
+      painter = QPainter(pixmap)
+      painter.setRenderHint(QPainter.Antialiasing)
+      gradient = QRadialGradient(w/4, h/6, w*5/3) #the color goes from the gradient focal point to the center point
+      gradient.setFocalPoint(w/3, h/4)
+      gradient.setColorAt(0, Qt.white)
+      gradient.setColorAt(1, cls.STATE_COLORS[state])
+      painter.setBrush(QBrush(gradient))
+      painter.setPen(QPen(Qt.black if mouseOver else Qt.gray))
+      painter.drawEllipse(0, 0, w-2, h-2) #-2 so that the border appears unclipped
+      painter.end()
+      cls._pixmaps[key] = pixmap
+    return pixmap
 
   def paintEvent(self, pe):
     painter = QPainter(self)
-    w = self.width()
-    h = self.height()
-    gradient = QRadialGradient(w/4, h/6, 50) #the color goes from the gradient focal point to the center point
-    gradient.setFocalPoint(w/3, h/4)
-    gradient.setColorAt(0, Qt.white)
-    if self._state == self.INACTIVE:
-      gradient.setColorAt(1, Qt.black)
-    if self._state == self.PENDING:
-      gradient.setColorAt(1, Qt.yellow)
-    elif self._state == self.REACHABLE:
-      gradient.setColorAt(1, Qt.green)
-    elif self._state == self.UNREACHABLE:
-      gradient.setColorAt(1, Qt.red)
-    brush = QBrush(gradient)
-    painter.setBrush(brush)
-    if self.mouse_over:
-      pen = QPen(Qt.black)
-    else:
-      pen = QPen(Qt.gray)
-    painter.setPen(pen)
-    painter.drawEllipse(0, 0, w-2, h-2) #-2 so that the border appears unclipped
+    painter.drawPixmap(0, 0, self.statePixmap(self.width(), self.height(), self._state,
+                                              self.mouse_over))
    
   def getState(self):
     return self._state
     
   def setState(self, state):
     self._state = state
-    if state == self.PENDING:
-      state_str = "Pending"
-    if state == self.REACHABLE:
-      state_str = "Ok"
-    if state == self.UNREACHABLE:
-      state_str = "Unreachable"
-    if state == self.INACTIVE:
-      state_str = "Cancelled"
-    self.setToolTip("{} -- {}".format(self.ip, state_str))
-    self.repaint()
+    self.setToolTip("{} -- {}".format(self.ip, self.STATE_NAMES[state]))
+    self.update() #queued, so several state changes cost a single paint
     
   state = property(getState, setState)
 
@@ -77,4 +80,4 @@ if __name__ == "__main__":
   app = QApplication(sys.argv)
   main = BallWidget()
   main.show()
-  sys.exit(app.exec_())
+  sys.exit(app.exec())
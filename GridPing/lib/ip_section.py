@@ -1,6 +1,8 @@
-from PySide.QtGui import *
-from PySide import QtCore
+from PySide6.QtWidgets import *
+from PySide6.QtGui import *
+from PySide6 import QtCore
 import sys, re, random
+from lib.targets import TargetSet, parseTargets, ipToInt, intToIp
 
 class IpSection(QWidget):
   """
@@ -12,8 +14,9 @@ class IpSection(QWidget):
   TEST_NOT_SELECTED = 0
   TEST_SINGLE_IP = 1
   TEST_IP_RANGE = 2
+  TEST_TARGET_LIST = 3
   class PingStartSignal(QtCore.QObject):
-    ping_start_signal = QtCore.Signal(list) #emit a list of strings (ips)
+    ping_start_signal = QtCore.Signal(object) #emit a TargetSet (reads like a list of ips)
   pss = PingStartSignal()
   pingStarted = pss.ping_start_signal
   
@@ -31,12 +34,16 @@ class IpSection(QWidget):
     #self.pingStopped.connect(self.pingStoppedHandler) ## the widget shouldn't react to stopping pinging until confirmed by the master
     label_ping_choice = QLabel("Ping Type")
     self.combobox_ping_choice = QComboBox()
-    self.combobox_ping_choice.addItems(["-" * 20, "Single IP Ping Test", "Multi-IP Ping Test"])
-    self.combobox_ping_choice.currentIndexChanged[int].connect(self.pingSelected)
+    self.combobox_ping_choice.addItems(["-" * 20, "Single IP Ping Test", "Multi-IP Ping Test",
+                                        "Target List Ping Test"])
+    self.combobox_ping_choice.currentIndexChanged.connect(self.pingSelected)
     self.label_ip1 = QLabel("IP")
     self.lineedit_ip1 = IPLineEdit()
     self.label_ip2 = QLabel("Range End")
     self.lineedit_ip2 = IPLineEdit()
+    self.label_targets = QLabel("Targets")
+    self.lineedit_targets = QLineEdit()
+    self.lineedit_targets.setPlaceholderText("10.0.0.0/24, 10.1.0.5-10.1.2.20, host.example.com")
     self.btn_start_stop = QPushButton("Start Pinging")
     self.btn_start_stop.clicked.connect(self.startStopPinging)
     self.label_warning = QLabel()
@@ -49,16 +56,20 @@ class IpSection(QWidget):
     #connect signals
     self.lineedit_ip1.editingFinished.connect(self.validateIP1)
     self.lineedit_ip2.editingFinished.connect(self.validateIP2)
+    self.lineedit_targets.editingFinished.connect(self.validateTargets)
     #hide what needs to
     self.label_ip1.hide()
     self.lineedit_ip1.hide()
     self.label_ip2.hide()
     self.lineedit_ip2.hide()
+    self.label_targets.hide()
+    self.lineedit_targets.hide()
     #setup layout
     layout = QFormLayout()
     layout.addRow(label_ping_choice,self.combobox_ping_choice) #span 2 columns
     layout.addRow(self.label_ip1, self.lineedit_ip1)
     layout.addRow(self.label_ip2, self.lineedit_ip2)
+    layout.addRow(self.label_targets, self.lineedit_targets)
     layout.addRow(self.btn_start_stop)
     #make a layout to fix the warning label alignment
     layout_warning = QHBoxLayout()
@@ -67,6 +78,8 @@ class IpSection(QWidget):
     self.setLayout(layout)
     
   def pingSelected(self, index):
+    self.label_targets.hide()
+    self.lineedit_targets.hide()
     if index == 0:
       self.test_mode = self.TEST_NOT_SELECTED
       self.label_ip1.hide()
@@ -89,10 +102,18 @@ class IpSection(QWidget):
       self.lineedit_ip1.show()
       self.label_ip2.show()
       self.lineedit_ip2.show()
+    elif index == 3:
+      self.test_mode = self.TEST_TARGET_LIST
+      self.label_ip1.hide()
+      self.lineedit_ip1.hide()
+      self.label_ip2.hide()
+      self.lineedit_ip2.hide()
+      self.label_targets.show()
+      self.lineedit_targets.show()
   
   def validateIP1(self):
     """IP1 should just follow the guidelines for normal ips"""
-    if self.test_mode != self.TEST_NOT_SELECTED: #maybe after the field judged invalid, the user chooses not to test
+    if self.test_mode in (self.TEST_SINGLE_IP, self.TEST_IP_RANGE): #maybe after the field judged invalid, the user chooses not to test
       text_ip1 = self.lineedit_ip1.text()
       text_ip1 = text_ip1.replace(' ', '') #remove spaces
       validator = IPValidator()
@@ -110,7 +131,7 @@ class IpSection(QWidget):
   def validateIP2(self):
     """IP2 should follow the guidelines of normal IPs, plus that
        it should match well with IP1"""
-    if self.test_mode != self.TEST_NOT_SELECTED:
+    if self.test_mode == self.TEST_IP_RANGE:
       """first check if the first ip is valid. Otherwise, validating second ip is useless.
          Also, this mitigates a recursive error, where both line edits fight over focus because
          both of them are invalid.
@@ -135,6 +156,22 @@ class IpSection(QWidget):
           return True
       else:
         return False
+    return True
+
+  def validateTargets(self):
+    """
+    The target list must parse, returns the TargetSet or None
+    """
+    if self.test_mode != self.TEST_TARGET_LIST:
+      return None
+    try:
+      targets = parseTargets(self.lineedit_targets.text())
+    except ValueError as e:
+      self.label_warning.setText(str(e))
+      self.lineedit_targets.setFocus()
+      return None
+    self.label_warning.setText('')
+    return targets
       
   def startStopPinging(self):
     """
@@ -148,25 +185,20 @@ class IpSection(QWidget):
       elif self.test_mode == self.TEST_SINGLE_IP:
         #test ip1
         if self.validateIP1():
-          ips = [self.lineedit_ip1.text()]
+          ips = TargetSet()
+          ips.addHost(self.lineedit_ip1.text().replace(' ', ''))
           self.pingStarted.emit(ips)
       elif self.test_mode == self.TEST_IP_RANGE:
         #validate both IPs
         if self.validateIP2():
-          text_ip1 = self.lineedit_ip1.text()
-          pos_lastdot = text_ip1.rfind('.')
-          header = text_ip1[:pos_lastdot+1]
-          range_start = int(text_ip1[pos_lastdot+1:])
-          text_ip2 = self.lineedit_ip2.text()
-          #pos_lastdot is applicable to the second ip too
-          range_end = int(text_ip2[pos_lastdot+1:]) 
-          ips = []
-          for i in range(range_start, range_end + 1): #inclusive
-            ips.append(header + str(i))
+          #the range is kept as a pair of integers, ips are made as they're pinged
+          ips = TargetSet()
+          ips.addRange(ipToInt(self.lineedit_ip1.text()), ipToInt(self.lineedit_ip2.text()))
+          self.pingStarted.emit(ips)
+      elif self.test_mode == self.TEST_TARGET_LIST:
+        ips = self.validateTargets()
+        if ips is not None:
           self.pingStarted.emit(ips)
-          self.ping_started = True
-          self.btn_start_stop.setText("Stop Pinging")
-          self.updateFields()
     elif self.ping_started:
       self.pingStopped.emit()
       
@@ -183,11 +215,11 @@ class IpSection(QWidget):
   def updateFields(self):
     if self.ping_started:
       for field in [self.combobox_ping_choice, self.lineedit_ip1,
-                    self.lineedit_ip2]:
+                    self.lineedit_ip2, self.lineedit_targets]:
         field.setEnabled(False)
     else:
       for field in [self.combobox_ping_choice, self.lineedit_ip1,
-                    self.lineedit_ip2]:
+                    self.lineedit_ip2, self.lineedit_targets]:
         field.setEnabled(True)
         
     
@@ -231,18 +263,8 @@ class SecondIPValidator(IPValidator):
     if initial != QValidator.Acceptable:
       self.invalidation_reason = self.UNFIXABLE
       return initial
-    #first, the first 3 sections must be identical
-    pos_lastdot_ip1 = self._first_ip.rfind('.')
-    header_ip1 = self._first_ip[:pos_lastdot_ip1]
-    pos_lastdot_ip2 = ip.rfind('.')
-    header_ip2 = ip[:pos_lastdot_ip2]
-    if header_ip2 != header_ip1:
-      self.invalidation_reason = self.HEADER_UNMATCH
-      return QValidator.Intermediate
-    #second, the fourth number must be higher
-    last1 = int(self._first_ip[pos_lastdot_ip1+1:])
-    last2 = int(ip[pos_lastdot_ip2+1:])
-    if not last2 > last1:
+    #the range may cross octets, the end just has to come after the start
+    if not ipToInt(ip) > ipToInt(self._first_ip):
       self.invalidation_reason = self.END_INVALID
       return QValidator.Intermediate
     return QValidator.Acceptable
@@ -252,15 +274,13 @@ class SecondIPValidator(IPValidator):
       pass
     if self.invalidation_reason == self.END_INVALID or \
       self.invalidation_reason == self.HEADER_UNMATCH:
-      #return the first 3 sections unchanged and the last randomly incremented
-      pos_lastdot = self._first_ip.rfind('.')
-      header_first = self._first_ip[:pos_lastdot+1]
-      end_first = int(self._first_ip[pos_lastdot+1:])
-      valid_end = min(random.choice(range(end_first, end_first+10)), 255)
-      return header_first + str(valid_end)
+      #return the first ip randomly incremented
+      first = ipToInt(self._first_ip)
+      valid_end = min(random.choice(range(first + 1, first + 10)), 0xffffffff)
+      return intToIp(valid_end)
       
 if __name__ == "__main__":
   app = QApplication(sys.argv)
   main = IpSection()
   main.show()
-  sys.exit(app.exec_())
\ No newline at end of file
+  sys.exit(app.exec())
\ No newline at end of file
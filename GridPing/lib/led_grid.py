@@ -0,0 +1,143 @@
+from __future__ import division
+from PySide6.QtWidgets import *
+from PySide6.QtGui import *
+from PySide6.QtCore import *
+import sys
+from lib.indicator_ball import BallWidget
+
+
+class LedGridView(QAbstractScrollArea):
+  """
+  A led view for big host sets. Instead of a widget per host, the whole grid
+  is drawn by this widget from a compact state array (a byte per host, holding
+  BallWidget states), and only the rows inside the viewport are painted.
+  The tooltip and hover cell are worked out from the mouse position.
+  Exposes the same interface as BallGrid.
+  """
+  #maps every state byte to itself, except pending which becomes inactive
+  CANCEL_TABLE = bytes(BallWidget.INACTIVE if i == BallWidget.PENDING else i for i in range(256))
+
+  def __init__(self, cellWidth, cellHeight, spacing, parent=None):
+    super(LedGridView, self).__init__(parent)
+    self.cw = cellWidth
+    self.ch = cellHeight
+    self.ls = spacing
+    self.ips = []
+    self.states = bytearray()
+    self.hover = -1
+    self.columns = 1
+    self.viewport().setMouseTracking(True)
+    self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+
+  def layoutForIps(self, ips):
+    self.ips = ips
+    self.states = bytearray(len(ips)) #all pending
+    self.hover = -1
+    self.relayout()
+
+  def clear(self):
+    self.layoutForIps([])
+
+  def setStateAt(self, i, state):
+    if self.states[i] != state:
+      self.states[i] = state
+      self.updateCell(i)
+
+  def pingingCancelledHandler(self):
+    """
+    Set all the leds that have state as pending to cancelled
+    """
+    self.states = self.states.translate(self.CANCEL_TABLE)
+    self.viewport().update()
+
+  def relayout(self):
+    pitch_x = self.cw + self.ls
+    self.columns = max(1, (self.viewport().width() + self.ls) // pitch_x)
+    rows = -(-len(self.states) // self.columns)
+    content_height = rows * (self.ch + self.ls)
+    scroll_bar = self.verticalScrollBar()
+    scroll_bar.setRange(0, max(0, content_height - self.viewport().height()))
+    scroll_bar.setPageStep(self.viewport().height())
+    scroll_bar.setSingleStep(self.ch + self.ls)
+    self.viewport().update()
+
+  def cellRect(self, i):
+    row, col = divmod(i, self.columns)
+    return QRect(col * (self.cw + self.ls), row * (self.ch + self.ls) - self.verticalScrollBar().value(),
+                 self.cw, self.ch)
+
+  def indexAt(self, pos):
+    """
+    Index of the host under pos (viewport coordinates), -1 if there's none
+    """
+    y = pos.y() + self.verticalScrollBar().value()
+    col, x_in_cell = divmod(pos.x(), self.cw + self.ls)
+    row, y_in_cell = divmod(y, self.ch + self.ls)
+    if col >= self.columns or x_in_cell >= self.cw or y_in_cell >= self.ch:
+      return -1 #on the spacing between cells
+    i = row * self.columns + col
+    return i if 0 <= i < len(self.states) else -1
+
+  def updateCell(self, i):
+    if i >= 0:
+      self.viewport().update(self.cellRect(i))
+
+  def resizeEvent(self, re):
+    self.relayout()
+
+  def scrollContentsBy(self, dx, dy):
+    self.viewport().update()
+
+  def paintEvent(self, pe):
+    painter = QPainter(self.viewport())
+    rect = pe.rect()
+    pitch_y = self.ch + self.ls
+    offset = self.verticalScrollBar().value()
+    first_row = max(0, (rect.top() + offset) // pitch_y)
+    last_row = (rect.bottom() + offset) // pitch_y
+    first = first_row * self.columns
+    last = min(len(self.states), (last_row + 1) * self.columns)
+    #blit the cached ball pixmaps, they are shared with BallWidget
+    pixmaps = [BallWidget.statePixmap(self.cw, self.ch, state, False)
+               for state in range(len(BallWidget.STATE_NAMES))]
+    for i in range(first, last):
+      row, col = divmod(i, self.columns)
+      x = col * (self.cw + self.ls)
+      y = row * pitch_y - offset
+      if i == self.hover:
+        painter.drawPixmap(x, y, BallWidget.statePixmap(self.cw, self.ch, self.states[i], True))
+      else:
+        painter.drawPixmap(x, y, pixmaps[self.states[i]])
+
+  def mouseMoveEvent(self, me):
+    i = self.indexAt(me.position().toPoint())
+    if i != self.hover:
+      old = self.hover
+      self.hover = i
+      self.updateCell(old)
+      self.updateCell(i)
+
+  def leaveEvent(self, le):
+    old = self.hover
+    self.hover = -1
+    self.updateCell(old)
+
+  def viewportEvent(self, event):
+    if event.type() == QEvent.ToolTip:
+      i = self.indexAt(event.pos())
+      if i >= 0:
+        QToolTip.showText(event.globalPos(), "{} -- {}".format(self.ips[i],
+                          BallWidget.STATE_NAMES[self.states[i]]), self.viewport())
+      else:
+        QToolTip.hideText()
+        event.ignore()
+      return True
+    return super(LedGridView, self).viewportEvent(event)
+
+if __name__ == "__main__":
+  app = QApplication(sys.argv)
+  window = LedGridView(10, 10, 1)
+  window.layoutForIps(["10.0.%d.%d" % (i // 256, i % 256) for i in range(65536)])
+  window.setMinimumSize(100, 100)
+  window.show()
+  sys.exit(app.exec())
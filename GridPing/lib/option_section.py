@@ -1,7 +1,10 @@
-from PySide.QtGui import QWidget, QLabel, QComboBox, QSpinBox, QFormLayout,\
-      QValidator, QAbstractSpinBox, QApplication
+from PySide6.QtWidgets import QWidget, QLabel, QComboBox, QSpinBox, QFormLayout,\
+      QAbstractSpinBox, QApplication, QCheckBox, QLineEdit
+from PySide6.QtGui import QValidator
 import sys
+from multiprocessing import cpu_count
 from lib.util import RequestData
+from lib.history_store import defaultPath
 
 class OptionSection(QWidget):
   """
@@ -22,6 +25,9 @@ class OptionSection(QWidget):
     self.spinbox_timeout.setSuffix(" ms")
     self.spinbox_timeout.setSingleStep(100)
     self.spinbox_timeout.setValue(1000)
+    self.checkbox_adaptive_timeout = QCheckBox("Adaptive")
+    self.checkbox_adaptive_timeout.setToolTip("Shorten the timeout from the round trip times "
+                                              "seen so far, up to the value set")
     label_delay = QLabel("Delay Between Packets")
     self.spinbox_delay = ValidatedSpinBox()
     self.spinbox_delay.setMaximum(9999999)
@@ -37,14 +43,118 @@ class OptionSection(QWidget):
     self.spinbox_packet_count = ValidatedSpinBox()
     self.spinbox_packet_count.setMaximum(9999999)
     self.spinbox_packet_count.setValue(3)
+    self.checkbox_sweep = QCheckBox("Find Live Hosts First")
+    self.checkbox_sweep.setToolTip("Probe every host once (retrying once) and send the "
+                                   "packets only to the hosts that answered")
+    self.checkbox_early_stop = QCheckBox("Stop Early When Stable")
+    self.checkbox_early_stop.setToolTip("Stop pinging a host once its loss and delay are "
+                                        "known to within 10%, the packet count being the most "
+                                        "it gets")
+    label_concurrency = QLabel("Concurrent Probes")
+    self.spinbox_concurrency = ValidatedSpinBox()
+    self.spinbox_concurrency.setMinimum(1)
+    self.spinbox_concurrency.setMaximum(4096)
+    self.spinbox_concurrency.setSingleStep(16)
+    self.spinbox_concurrency.setValue(RequestData.DEFAULT_CONCURRENCY)
+    label_workers = QLabel("Worker Processes")
+    self.spinbox_workers = ValidatedSpinBox()
+    self.spinbox_workers.setMinimum(1)
+    self.spinbox_workers.setMaximum(256)
+    self.spinbox_workers.setValue(cpu_count())
+    label_backend = QLabel("Probe Method")
+    self.combobox_backend = QComboBox()
+    #in the order of the RequestData.BACKEND_* values
+    self.combobox_backend.addItems(["Automatic", "ICMP (raw socket)", "ICMP (unprivileged)",
+                                    "TCP Connect", "Simulated"])
+    self.combobox_backend.currentIndexChanged.connect(self.backendSelected)
+    self.label_port = QLabel("TCP Port")
+    self.spinbox_port = ValidatedSpinBox()
+    self.spinbox_port.setMinimum(1)
+    self.spinbox_port.setMaximum(65535)
+    self.spinbox_port.setValue(80)
+    label_packet_rate = QLabel("Rate Limit")
+    self.spinbox_packet_rate = ValidatedSpinBox()
+    self.spinbox_packet_rate.setMaximum(9999999)
+    self.spinbox_packet_rate.setSingleStep(100)
+    self.spinbox_packet_rate.setSuffix(" packets/s")
+    self.spinbox_packet_rate.setSpecialValueText("Unlimited")
+    label_byte_rate = QLabel("Bandwidth Limit")
+    self.spinbox_byte_rate = ValidatedSpinBox()
+    self.spinbox_byte_rate.setMaximum(9999999)
+    self.spinbox_byte_rate.setSingleStep(100)
+    self.spinbox_byte_rate.setSuffix(" KB/s")
+    self.spinbox_byte_rate.setSpecialValueText("Unlimited")
+    label_round_period = QLabel("Repeat Every")
+    self.spinbox_round_period = ValidatedSpinBox()
+    self.spinbox_round_period.setMaximum(86400)
+    self.spinbox_round_period.setSingleStep(10)
+    self.spinbox_round_period.setSuffix(" s")
+    self.spinbox_round_period.setSpecialValueText("Never")
+    label_stats_window = QLabel("Statistics Window")
+    self.spinbox_stats_window = ValidatedSpinBox()
+    self.spinbox_stats_window.setMinimum(1)
+    self.spinbox_stats_window.setMaximum(1440)
+    self.spinbox_stats_window.setValue(15)
+    self.spinbox_stats_window.setSuffix(" min")
+    self.checkbox_change_only = QCheckBox("Only Report Changes")
+    self.checkbox_change_only.setToolTip("Between rounds, only hosts going up or down or "
+                                         "changing delay are reported")
+    label_rtt_band = QLabel("Delay Change")
+    self.spinbox_rtt_band = ValidatedSpinBox()
+    self.spinbox_rtt_band.setMinimum(1)
+    self.spinbox_rtt_band.setMaximum(1000)
+    self.spinbox_rtt_band.setValue(25)
+    self.spinbox_rtt_band.setSuffix(" %")
+    self.checkbox_history = QCheckBox("Keep History")
+    self.checkbox_history.setToolTip("Also keep every sample in an SQLite database, "
+                                     "across runs")
+    self.checkbox_history.toggled.connect(self.historyToggled)
+    self.label_history_path = QLabel("History File")
+    self.lineedit_history_path = QLineEdit(defaultPath())
+    self.label_history_size = QLabel("History Size")
+    self.spinbox_history_size = ValidatedSpinBox()
+    self.spinbox_history_size.setMinimum(1)
+    self.spinbox_history_size.setMaximum(2000)
+    self.spinbox_history_size.setValue(RequestData.DEFAULT_HISTORY_SAMPLES // 1000000)
+    self.spinbox_history_size.setSuffix(" million samples")
+    self.spinbox_history_size.setToolTip("The oldest samples go past that many")
     #setup layout
     layout = QFormLayout()
     layout.addRow(label_buffer_size, self.spinbox_buffer_size)
     layout.addRow(label_timeout, self.spinbox_timeout)
+    layout.addRow("", self.checkbox_adaptive_timeout)
     layout.addRow(label_delay, self.spinbox_delay)
     layout.addRow(label_delay_distribution, self.combobox_delay_distribution)
     layout.addRow(label_packet_count, self.spinbox_packet_count)
+    layout.addRow("", self.checkbox_sweep)
+    layout.addRow("", self.checkbox_early_stop)
+    layout.addRow(label_concurrency, self.spinbox_concurrency)
+    layout.addRow(label_workers, self.spinbox_workers)
+    layout.addRow(label_backend, self.combobox_backend)
+    layout.addRow(self.label_port, self.spinbox_port)
+    layout.addRow(label_packet_rate, self.spinbox_packet_rate)
+    layout.addRow(label_byte_rate, self.spinbox_byte_rate)
+    layout.addRow(label_round_period, self.spinbox_round_period)
+    layout.addRow(label_stats_window, self.spinbox_stats_window)
+    layout.addRow("", self.checkbox_change_only)
+    layout.addRow(label_rtt_band, self.spinbox_rtt_band)
+    layout.addRow("", self.checkbox_history)
+    layout.addRow(self.label_history_path, self.lineedit_history_path)
+    layout.addRow(self.label_history_size, self.spinbox_history_size)
     self.setLayout(layout)
+    self.backendSelected(self.combobox_backend.currentIndex())
+    self.historyToggled(self.checkbox_history.isChecked())
+
+  def backendSelected(self, index):
+    #the port only means something to the tcp backend
+    self.label_port.setVisible(index == RequestData.BACKEND_TCP)
+    self.spinbox_port.setVisible(index == RequestData.BACKEND_TCP)
+
+  def historyToggled(self, checked):
+    #where and how much only matter with a history
+    for widget in [self.label_history_path, self.lineedit_history_path,
+                   self.label_history_size, self.spinbox_history_size]:
+      widget.setVisible(checked)
     
   def getOptions(self):
     """
@@ -54,7 +164,16 @@ class OptionSection(QWidget):
     timeout = self.spinbox_timeout.value()
     delay = self.spinbox_delay.value() / 1000
     packet_count = self.spinbox_packet_count.value()
+    concurrency = self.spinbox_concurrency.value()
+    workers = self.spinbox_workers.value()
+    backend = self.combobox_backend.currentIndex()
+    port = self.spinbox_port.value()
+    packet_rate = self.spinbox_packet_rate.value()
+    byte_rate = self.spinbox_byte_rate.value() * 1000
     selected_distribution = self.combobox_delay_distribution.currentIndex()
+    history_path = None
+    if self.checkbox_history.isChecked():
+      history_path = self.lineedit_history_path.text().strip() or defaultPath()
     if selected_distribution == 0:
       distribution = RequestData.DISTRIBUTION_CONSTANT
     elif selected_distribution == 1:
@@ -66,18 +185,43 @@ class OptionSection(QWidget):
     elif selected_distribution == 4:
       distribution = RequestData.DISTRIBUTION_EXPONENTIAL
     
-    return RequestData(buf_size, timeout, delay, packet_count, distribution)
+    return RequestData(buf_size, timeout, delay, packet_count, distribution,
+                       concurrency, workers, backend, port, packetRate=packet_rate,
+                       byteRate=byte_rate,
+                       adaptiveTimeout=self.checkbox_adaptive_timeout.isChecked(),
+                       sweep=self.checkbox_sweep.isChecked(),
+                       earlyStop=self.checkbox_early_stop.isChecked(),
+                       roundPeriod=self.spinbox_round_period.value(),
+                       statsWindow=self.spinbox_stats_window.value() * 60,
+                       changeOnly=self.checkbox_change_only.isChecked(),
+                       historyPath=history_path,
+                       historyMaxSamples=self.spinbox_history_size.value() * 1000000,
+                       rttBand=self.spinbox_rtt_band.value() / 100)
   
   def disableWidgets(self):
     for widget in [self.spinbox_buffer_size, self.spinbox_delay,
                    self.spinbox_packet_count, self.spinbox_timeout, 
-                   self.combobox_delay_distribution]:
+                   self.combobox_delay_distribution, self.spinbox_concurrency,
+                   self.spinbox_workers, self.combobox_backend, self.spinbox_port,
+                   self.spinbox_packet_rate, self.spinbox_byte_rate,
+                   self.checkbox_adaptive_timeout, self.checkbox_sweep,
+                   self.checkbox_early_stop, self.spinbox_round_period,
+                   self.spinbox_stats_window, self.checkbox_change_only,
+                   self.spinbox_rtt_band, self.checkbox_history,
+                   self.lineedit_history_path, self.spinbox_history_size]:
       widget.setEnabled(False)
   
   def enableWidgets(self):
     for widget in [self.spinbox_buffer_size, self.spinbox_delay,
                    self.spinbox_packet_count, self.spinbox_timeout, 
-                   self.combobox_delay_distribution]:
+                   self.combobox_delay_distribution, self.spinbox_concurrency,
+                   self.spinbox_workers, self.combobox_backend, self.spinbox_port,
+                   self.spinbox_packet_rate, self.spinbox_byte_rate,
+                   self.checkbox_adaptive_timeout, self.checkbox_sweep,
+                   self.checkbox_early_stop, self.spinbox_round_period,
+                   self.spinbox_stats_window, self.checkbox_change_only,
+                   self.spinbox_rtt_band, self.checkbox_history,
+                   self.lineedit_history_path, self.spinbox_history_size]:
       widget.setEnabled(True)
         
 class ValidatedSpinBox(QSpinBox):
@@ -100,4 +244,4 @@ if __name__ == "__main__":
   app = QApplication(sys.argv)
   main = OptionSection()
   main.show()
-  sys.exit(app.exec_())
\ No newline at end of file
+  sys.exit(app.exec())
\ No newline at end of file
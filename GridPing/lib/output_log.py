@@ -0,0 +1,267 @@
+from __future__ import division
+from PySide6.QtWidgets import *
+from PySide6.QtGui import *
+from PySide6.QtCore import *
+import sys
+from array import array
+from lib.util import formatReply, formatTimestamp
+
+
+class ReplyLog(object):
+  """
+  Ring buffer of the output log's lines, kept as compact records (host index,
+  timestamp, size, rtt, packets lost) in fixed size arrays; the text is only
+  made when a line is shown. Holds the last `capacity` lines, older ones are
+  dropped, so memory stays flat however long the session.
+  Lines are numbered by a sequence number that keeps counting up; a filter
+  keeps the sequence numbers of the lines matching it in order.
+  """
+  FILTER_ALL = 0
+  FILTER_TIMEOUTS = 1
+  FILTER_REPLIES = 2
+
+  def __init__(self, capacity=100000):
+    super(ReplyLog, self).__init__()
+    self.filter = self.FILTER_ALL
+    self.capacity = 0
+    self._end = 0 #sequence number of the next line
+    self._count = 0
+    self.setCapacity(capacity)
+
+  def setCapacity(self, capacity):
+    """
+    Changes the retention cap, keeping the newest lines that still fit.
+    Sequence numbers start over.
+    """
+    capacity = max(1, capacity)
+    kept = [self.record(seq) for seq in range(max(self.first(), self.end() - capacity), self.end())]
+    self.capacity = capacity
+    self._index = array('I', [0]) * capacity
+    self._timestamp = array('q', [0]) * capacity
+    self._size = array('I', [0]) * capacity
+    self._rtt = array('d', [0]) * capacity
+    self._lost = array('I', [0]) * capacity
+    self.clear()
+    for line in kept:
+      self.append(*line)
+
+  def clear(self):
+    self._end = 0
+    self._count = 0
+    self._matches = array('q')
+    self._match_start = 0
+
+  def first(self):
+    return self._end - self._count
+
+  def end(self):
+    return self._end
+
+  def append(self, index, timestamp, size, rtt, packetsLost):
+    seq = self._end
+    pos = seq % self.capacity
+    self._index[pos] = index
+    self._timestamp[pos] = timestamp
+    self._size[pos] = size
+    self._rtt[pos] = rtt
+    self._lost[pos] = packetsLost
+    self._end += 1
+    if self._count < self.capacity:
+      self._count += 1
+    if self.filter != self.FILTER_ALL and self.matches(seq):
+      self._matches.append(seq)
+
+  def record(self, seq):
+    pos = seq % self.capacity
+    return (self._index[pos], self._timestamp[pos], self._size[pos], self._rtt[pos],
+            self._lost[pos])
+
+  def matches(self, seq):
+    lost = self._lost[seq % self.capacity]
+    if self.filter == self.FILTER_TIMEOUTS:
+      return lost > 0
+    if self.filter == self.FILTER_REPLIES:
+      return lost == 0
+    return True
+
+  def setFilter(self, lineFilter):
+    self.filter = lineFilter
+    self._matches = array('q')
+    self._match_start = 0
+    if lineFilter != self.FILTER_ALL:
+      self._matches.extend(seq for seq in range(self.first(), self.end()) if self.matches(seq))
+
+  def dropExpiredMatches(self):
+    """
+    Forget the filtered lines that fell out of the buffer, returns how many
+    """
+    first = self.first()
+    start = self._match_start
+    while start < len(self._matches) and self._matches[start] < first:
+      start += 1
+    dropped = start - self._match_start
+    self._match_start = start
+    if start > 4096 and start > len(self._matches) // 2: #compact once in a while
+      del self._matches[:start]
+      self._match_start = 0
+    return dropped
+
+  def __len__(self):
+    if self.filter == self.FILTER_ALL:
+      return self._count
+    return len(self._matches) - self._match_start
+
+  def seqAt(self, row):
+    """
+    Sequence number of the row-th line shown under the current filter
+    """
+    if self.filter == self.FILTER_ALL:
+      return self.first() + row
+    return self._matches[self._match_start + row]
+
+
+class OutputLogModel(QAbstractListModel):
+  """
+  Presents a ReplyLog to a list view, formatting only the rows asked for.
+  New lines go in through append and reach the view on flush(), as a single
+  row insertion (and a removal for lines that fell off) per batch.
+  """
+  TIMEOUT_COLOR = QColor(200, 40, 40)
+
+  def __init__(self, capacity=100000, parent=None):
+    super(OutputLogModel, self).__init__(parent)
+    self.log = ReplyLog(capacity)
+    self.ips = []
+    self._shown = 0 #rows the view knows about, the oldest lines matching the filter
+    self._first = 0 #oldest line in the log at the last flush
+
+  def setIps(self, ips):
+    self.beginResetModel()
+    self.ips = ips
+    self.log.clear()
+    self._synced()
+    self.endResetModel()
+
+  def _synced(self):
+    self._shown = len(self.log)
+    self._first = self.log.first()
+
+  def append(self, index, timestamp, size, rtt, packetsLost):
+    self.log.append(index, timestamp, size, rtt, packetsLost)
+
+  def flush(self):
+    """
+    Tell the view about the lines appended (and dropped) since the last flush
+    """
+    #lines that fell off since the last flush, the oldest shown ones first
+    if self.log.filter == ReplyLog.FILTER_ALL:
+      dropped = self.log.first() - self._first
+    else:
+      dropped = self.log.dropExpiredMatches()
+    self._first = self.log.first()
+    dropped = min(dropped, self._shown)
+    if dropped:
+      self.beginRemoveRows(QModelIndex(), 0, dropped - 1)
+      self._shown -= dropped
+      self.endRemoveRows()
+    added = len(self.log) - self._shown
+    if added > 0:
+      self.beginInsertRows(QModelIndex(), self._shown, self._shown + added - 1)
+      self._shown += added
+      self.endInsertRows()
+
+  def setCapacity(self, capacity):
+    self.beginResetModel()
+    self.log.setCapacity(capacity)
+    self.log.setFilter(self.log.filter)
+    self._synced()
+    self.endResetModel()
+
+  def setFilter(self, lineFilter):
+    self.beginResetModel()
+    self.log.setFilter(lineFilter)
+    self._synced()
+    self.endResetModel()
+
+  def rowCount(self, parent=QModelIndex()):
+    if parent.isValid():
+      return 0
+    return self._shown
+
+  def data(self, index, role=Qt.DisplayRole):
+    if not index.isValid() or index.row() >= self._shown:
+      return None
+    host, timestamp, size, rtt, lost = self.log.record(self.log.seqAt(index.row()))
+    if role == Qt.DisplayRole:
+      return formatReply(formatTimestamp(timestamp), self.ips[host], size, rtt, lost)
+    if role == Qt.ForegroundRole and lost:
+      return self.TIMEOUT_COLOR
+    return None
+
+
+class OutputLogView(QWidget):
+  """
+  The output tab: the log lines in a list view that only lays out and paints
+  the visible rows, with the retention cap and a filter above it.
+  Follows the newest line while scrolled to the bottom.
+  """
+  FILTERS = ["All Lines", "Timeouts Only", "Replies Only"] #in ReplyLog.FILTER_* order
+
+  def __init__(self, parent=None):
+    super(OutputLogView, self).__init__(parent)
+    self.model = OutputLogModel()
+    self.list_view = QListView()
+    self.list_view.setUniformItemSizes(True) #row heights aren't measured one by one
+    self.list_view.setModel(self.model)
+    self.list_view.setSelectionMode(QAbstractItemView.ExtendedSelection)
+    label_filter = QLabel("Show")
+    self.combobox_filter = QComboBox()
+    self.combobox_filter.addItems(self.FILTERS)
+    self.combobox_filter.currentIndexChanged.connect(self.model.setFilter)
+    label_capacity = QLabel("Keep")
+    self.spinbox_capacity = QSpinBox()
+    self.spinbox_capacity.setRange(1000, 10000000)
+    self.spinbox_capacity.setSingleStep(10000)
+    self.spinbox_capacity.setSuffix(" lines")
+    self.spinbox_capacity.setValue(self.model.log.capacity)
+    self.spinbox_capacity.editingFinished.connect(self.capacityChanged)
+    #setup layout
+    controls_layout = QHBoxLayout()
+    controls_layout.addWidget(label_filter)
+    controls_layout.addWidget(self.combobox_filter)
+    controls_layout.addStretch()
+    controls_layout.addWidget(label_capacity)
+    controls_layout.addWidget(self.spinbox_capacity)
+    layout = QVBoxLayout()
+    layout.setContentsMargins(0, 0, 0, 0)
+    layout.addLayout(controls_layout)
+    layout.addWidget(self.list_view)
+    self.setLayout(layout)
+
+  def capacityChanged(self):
+    if self.spinbox_capacity.value() != self.model.log.capacity:
+      self.model.setCapacity(self.spinbox_capacity.value())
+
+  def setIps(self, ips):
+    self.model.setIps(ips)
+
+  def append(self, index, timestamp, size, rtt, packetsLost):
+    self.model.append(index, timestamp, size, rtt, packetsLost)
+
+  def flush(self):
+    scroll_bar = self.list_view.verticalScrollBar()
+    following = scroll_bar.value() == scroll_bar.maximum()
+    self.model.flush()
+    if following:
+      self.list_view.scrollToBottom()
+
+if __name__ == "__main__":
+  app = QApplication(sys.argv)
+  window = OutputLogView()
+  ips = ["10.0.%d.%d" % (i // 256, i % 256) for i in range(65536)]
+  window.setIps(ips)
+  for i in range(len(ips)):
+    window.append(i, 1500000000000 + i, 55, 0 if i % 7 == 0 else 12.5, 1 if i % 7 == 0 else 0)
+  window.flush()
+  window.show()
+  sys.exit(app.exec())
@@ -1,89 +1,277 @@
-from PySide.QtGui import QWidget, QPushButton, QLabel, QVBoxLayout, QApplication
-import sys, time, random, pyping, numpy as np
-from multiprocessing import Pipe
-from lib.util import RequestData, ReplyData
+import sys, socket, asyncio
+from lib.wire import FrameWriter, FLAG_LOST, FLAG_HOST_DONE
+from lib.backends import createBackend
+from lib.resolver import sharedCache
+from lib.scheduler import PacketScheduler, ScheduledHost
+from lib.delays import DelaySampler
+from lib.rate_limit import RateLimiter
+from lib.rtt_estimator import AdaptiveTimeouts
+from lib.early_stop import ConvergenceTest
+from lib.change_filter import ChangeFilter
+#the history store (and sqlite3) is only imported by runs keeping a history,
+#so importing the pinger stays cheap for worker processes and the command line
 
 class Pinger(object):
   """
-  Takes a list if ips/hosts to ping, and sends the ping responses
+  Takes a list of ips/hosts to ping, and sends the ping responses
   back into a passed-in pipe.
-  It may not be necessary to have a pinger_process thread
+  Packets are sent on an asyncio loop through a PacketScheduler (see
+  lib.scheduler), which interleaves the hosts: at most reqData.concurrency
+  probes are in flight, and the delay between two packets of a host is
+  spent probing other hosts. Delays are drawn in batches by a DelaySampler
+  and sends fire on deadlines off a timer wheel. Every packet becomes a record
+  in the binary wire format (see lib.wire), tagged with the host's index;
+  the last packet for a host carries FLAG_HOST_DONE.
+  Probes go through the backend reqData.backend picks (see lib.backends),
+  opened once for the whole run. Hostnames are resolved through the
+  process' ResolverCache before a host is scheduled, so slow lookups
+  don't hold up probing; lookup times are reported in FRAME_RESOLVE records.
+  indexList optionally maps positions in ipList to the indices reported
+  back, for pingers that only handle a shard of a bigger list.
+  With reqData.adaptive_timeout, every probe's timeout comes from
+  AdaptiveTimeouts, reqData.timeout being the longest it may get. A host
+  whose first probe went unanswered is probably dead, it gets one more
+  probe to confirm it, see sendPacket.
+  With reqData.sweep, a liveness sweep (see discoverHost) comes first and only
+  the hosts that answered it get reqData.packet_count packets.
+  With reqData.early_stop, a host is done as soon as its loss rate and rtt
+  have converged (see lib.early_stop), before packet_count if it can.
+  With reqData.round_period, the same worker keeps pinging the hosts in
+  rounds (continuous monitoring), see probeAll. With reqData.change_only on
+  top, packet records go through a ChangeFilter and only hosts whose state
+  changed since their last report are sent.
+  With reqData.history_path, every packet record is also written to that
+  HistoryStore (see lib.history_store) by the pinger itself, ahead of any
+  ChangeFilter, so the history gets every sample whatever reaches the pipe.
+  rateLimiter is a RateLimiter shared with the other shards; without one the
+  pinger enforces reqData's rate limits by itself.
   """
-  def __init__(self, ipList, reqData, replyPipe, parent=None):
+  ACTIVE_HOSTS_PER_SLOT = 16 #hosts interleaved per probe slot, the rest wait in the list
+  SWEEP_CONCURRENCY = 4 #times the concurrency the liveness sweep runs at
+  DISCOVERY_TRIES = 2 #liveness probes before a host is given up on
+  def __init__(self, ipList, reqData, replyPipe, indexList=None, rateLimiter=None, parent=None):
     super(Pinger, self).__init__()
     self._ips = ipList
+    self._indices = indexList if indexList is not None else range(len(ipList))
     self.req_data = reqData
     self.reply_pipe = replyPipe
+    self.writer = FrameWriter(replyPipe)
+    self.history = None #opened by run()
+    self.history_writer = None
+    self.output = self.writer #where the packet records go, besides the history
+    if reqData.round_period and reqData.change_only:
+      self.output = ChangeFilter(self.writer, reqData.rtt_band)
+    self.rate_limiter = rateLimiter if rateLimiter is not None else RateLimiter.forRequest(reqData)
+    self.timeouts = AdaptiveTimeouts(reqData.timeout) if reqData.adaptive_timeout else None
+    self.delays = DelaySampler(reqData)
+    self.convergence = None
+    if reqData.early_stop:
+      self.convergence = ConvergenceTest(reqData.loss_precision, reqData.rtt_precision)
 
   def run(self):
-    for dest in self._ips:
-      """
-      For each ip, make an aggregate of all packet responses and then send the
-      aggregate to the pipe.
-      """
-      packets_sent = 0
-      reply_data = ReplyData()
-      while packets_sent < self.req_data.packet_count:
-        r = pyping.ping(dest, count=1, packet_size=self.req_data.buf_size,
-                        timeout=self.req_data.timeout)
-        reply_data = reply_data + ReplyData(r.destination_ip, r.packet_size, r.avg_rtt, r.packet_lost)
-        #now figure out how to send this response to the caller thread
-        packets_sent += 1
-        time.sleep(self.getDelay(self.req_data))
-      self.reply_pipe.send(reply_data)
-      #send a reply that indicates we are finished
-      finish_reply = ReplyData(finalReply=True)
-    self.reply_pipe.send(finish_reply)
-    
-  def getDelay(self, reqData):
-    """
-    Figures out the packet delay based on the delay value and distribution
-    """
-    #delay is in seconds... Right?. this is needed for time.sleep
-    if reqData.distribution == RequestData.DISTRIBUTION_CONSTANT:
-      return reqData.delay
-    elif reqData.distribution == RequestData.DISTRIBUTION_UNIFORM:
-      delay = random.uniform(0, reqData.delay) #uniformly random value between zero, request delay
-    elif reqData.distribution == RequestData.DISTRIBUTION_GAUSSIAN:
-      delay = np.random.normal(reqData.delay)
-    elif reqData.distribution == RequestData.DISTRIBUTION_POISSON:
-      delay = np.random.poisson(reqData.delay)
-    elif reqData.distribution == RequestData.DISTRIBUTION_EXPONENTIAL:
-      delay = np.random.exponential(reqData.delay)
-    return delay
+    self.openHistory()
+    loop = asyncio.new_event_loop()
+    try:
+      self.backend = createBackend(self.req_data, loop)
+      probing = asyncio.ensure_future(self.probeAll(), loop=loop)
+      try:
+        loop.run_until_complete(probing)
+      except KeyboardInterrupt: #how a monitoring run in this process ends, finish cleanly
+        tasks = asyncio.all_tasks(loop)
+        for task in tasks:
+          task.cancel()
+        loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+      finally:
+        self.backend.close()
+    finally:
+      loop.close()
+      if self.history is not None: #written out before the gui hears we're done
+        self.history_writer.flush()
+        self.history.close()
+    #flush what's left and send a frame that indicates we are finished
+    self.writer.finish()
 
-class PingerView(QWidget):
-  def __init__(self, parent=None):
-    super(PingerView, self).__init__(parent)
-    self.state = 0
-    layout = QVBoxLayout()
-    self.btn_start_stop = QPushButton("Start Pinging")
-    self.lbl_output = QLabel()
-    self.btn_start_stop.clicked.connect(self.controlThread)
-    layout.addWidget(self.btn_start_stop)
-    layout.addWidget(self.lbl_output)
-    self.setLayout(layout)
-    
-  def createPingerThread(self):
-    req_data = RequestData(100, 1000, 1000, 3)
-    self.receive_pipe, send_pipe =  Pipe(duplex=False)
-    self.pinger_process = Pinger(["www.google.com"], req_data, send_pipe)
+  def openHistory(self):
+    if not self.req_data.history_path:
+      return
+    from lib.history_store import HistoryStore
+    import sqlite3
+    try:
+      self.history = HistoryStore(self.req_data.history_path, self.req_data.history_retention,
+                                  self.req_data.history_max_samples)
+    except (sqlite3.Error, OSError) as e: #ping anyway, without the history
+      sys.stderr.write("Can't open the history %s: %s\n" % (self.req_data.history_path, e))
+      return
+    self.history.setHosts(self._ips, self._indices)
+    self.history_writer = FrameWriter(self.history) #takes frames like a pipe
 
-  def controlThread(self):
-    if self.state == 0:
-      self.createPingerThread()
-      self.state = 1
-      self.btn_start_stop.setText("Stop Pinging")
-      self.pinger_process.start()
-      data  = self.receive_pipe.recv()
-      self.lbl_output.setText(str(data))
-      self.pinger_process.terminate()
-      self.pinger_process.wait()
-      self.state = 0
-      self.btn_start_stop.setText("Start Pinging")
-      
-if __name__ == "__main__":
-  app = QApplication(sys.argv)
-  main = PingerView()
-  main.show()
-  sys.exit(app.exec_())
+  def writeRecord(self, index, size, rtt, flags):
+    if self.history_writer is not None:
+      self.history_writer.write(index, size, rtt, flags)
+    self.output.write(index, size, rtt, flags)
+
+  async def probeAll(self):
+    """
+    Ping every host once, or with reqData.round_period, again and again in
+    rounds starting that many seconds apart (right away when a round ran
+    over), until the process is stopped. Every round ends with a FRAME_ROUND.
+    The backend, resolver cache and rtt estimates carry over between rounds.
+    """
+    self.resolver = sharedCache()
+    self.resolver.reset()
+    flusher = asyncio.ensure_future(self.flushPeriodically())
+    try:
+      if not self.req_data.round_period:
+        await self.probeRound()
+        return
+      loop = asyncio.get_event_loop()
+      round_number = 0
+      while True:
+        started = loop.time()
+        await self.probeRound()
+        round_number += 1
+        if self.output is not self.writer:
+          self.output.endRound()
+        self.writer.writeRound(round_number)
+        await asyncio.sleep(max(0, started + self.req_data.round_period - loop.time()))
+    finally:
+      flusher.cancel()
+
+  async def probeRound(self):
+    """
+    Ping every host, in two phases when reqData.sweep asks for it: first a
+    quick liveness probe of every host, then the full measurement of the
+    hosts that answered.
+    """
+    hosts = zip(self._indices, self._ips)
+    if self.req_data.sweep and self.req_data.packet_count > 1:
+      self.live_hosts = []
+      await self.runPhase(hosts, self.discoverHost, lambda: 0,
+                          self.req_data.concurrency * self.SWEEP_CONCURRENCY)
+      hosts, self.live_hosts = self.live_hosts, None
+    await self.runPhase(hosts, self.sendPacket, self.delays.next, self.req_data.concurrency)
+
+  async def runPhase(self, hosts, send, delay, concurrency):
+    """
+    Feed (index, host) pairs to a packet scheduler, which interleaves their
+    packets and sends them through send. Hosts are pulled lazily, only as
+    many as the scheduler's active window has room for, so the number of
+    hosts in memory is bounded.
+    """
+    scheduler = PacketScheduler(send, delay, concurrency, concurrency * self.ACTIVE_HOSTS_PER_SLOT,
+                                self.throttle if self.rate_limiter is not None else None)
+    scheduling = asyncio.ensure_future(scheduler.run())
+    try:
+      for index, dest in hosts:
+        await scheduler.admit()
+        asyncio.ensure_future(self.addHost(scheduler, index, dest))
+      scheduler.close()
+      await scheduling
+    finally:
+      scheduling.cancel()
+
+  async def flushPeriodically(self):
+    while True:
+      await asyncio.sleep(self.writer.max_latency)
+      self.writer.flushIfStale()
+      if self.history_writer is not None:
+        self.history_writer.flushIfStale()
+
+  async def addHost(self, scheduler, index, dest):
+    """
+    Resolve the host and hand it to the scheduler
+    """
+    ip = dest
+    if self.backend.NEEDS_ADDRESS:
+      try:
+        ip, spent = await self.resolver.resolve(dest)
+        if spent:
+          self.writer.writeResolve(index, spent * 1000)
+      except socket.error: #unresolvable host, every packet is lost
+        ip = None
+    scheduler.add(ScheduledHost(index, ip))
+
+  async def throttle(self, host):
+    await self.rate_limiter.take(self.req_data.buf_size)
+
+  async def probe(self, host, fullTimeout=False):
+    """
+    One probe of a host, returns the rtt or None when it's lost. host.ip is
+    None for hosts that didn't resolve, their packets are all lost.
+    fullTimeout waits the configured timeout whatever the adaptive timeouts say.
+    """
+    if host.ip is None:
+      return None
+    timeout = self.req_data.timeout
+    if self.timeouts is not None and not fullTimeout:
+      timeout = self.timeouts.timeoutFor(host.index, host.ip)
+    rtt = None
+    try:
+      rtt = await self.backend.probe(host.ip, self.req_data.buf_size, timeout)
+    except socket.error: #unreachable network and the like, count it as a lost packet
+      pass
+    if self.timeouts is not None:
+      self.timeouts.update(host.index, host.ip, rtt)
+    return rtt
+
+  def forgetTimeouts(self, host):
+    """
+    Drop a finished host's rtt estimate, unless it's pinged again next round
+    """
+    if self.timeouts is not None and not self.req_data.round_period:
+      self.timeouts.forget(host.index)
+
+  async def discoverHost(self, host):
+    """
+    Liveness probe of the sweep, retried once. Hosts that answer are kept for
+    the measurement phase and their probes aren't reported; for the others
+    the lost probes are their result, the last one finishing the host.
+    The last try waits the configured timeout, a host is only left out of the
+    measurement when it didn't answer within it.
+    """
+    host.sent += 1
+    if await self.probe(host, host.sent >= self.DISCOVERY_TRIES) is not None:
+      self.live_hosts.append((host.index, host.ip))
+      return False
+    if host.sent < self.DISCOVERY_TRIES:
+      return True
+    for i in range(host.sent):
+      flags = FLAG_LOST | (FLAG_HOST_DONE if i == host.sent - 1 else 0)
+      self.writeRecord(host.index, self.req_data.buf_size, 0, flags)
+    self.forgetTimeouts(host)
+    return False
+
+  async def sendPacket(self, host):
+    """
+    Send the next packet of a host and write its record.
+    Returns True while the host has packets left to send.
+    With adaptive timeouts, the first probe of a host without an rtt
+    estimate of its own only tells whether it's alive: its timeout is
+    borrowed from other hosts, so when it's lost it isn't counted and the
+    host is probed again, with the configured timeout. A host answering
+    that gets its packets as usual, one that doesn't is taken as dead and
+    is done with that lost packet, its remaining packets aren't sent.
+    """
+    confirming, host.suspect = host.suspect, False
+    unknown = (host.sent == 0 and host.ip is not None and self.timeouts is not None and
+               not self.timeouts.hasEstimate(host.index))
+    host.sent += 1
+    rtt = await self.probe(host, confirming)
+    if rtt is None and unknown and not confirming:
+      host.sent = 0
+      host.suspect = True
+      return True
+    done = host.sent >= self.req_data.packet_count or (rtt is None and confirming)
+    if self.convergence is not None:
+      self.convergence.add(host.index, rtt)
+      done = done or self.convergence.converged(host.index)
+      if done:
+        self.convergence.forget(host.index)
+    flags = FLAG_HOST_DONE if done else 0
+    if done:
+      self.forgetTimeouts(host)
+    if rtt is None:
+      self.writeRecord(host.index, self.req_data.buf_size, 0, flags | FLAG_LOST)
+    else:
+      self.writeRecord(host.index, self.req_data.buf_size, rtt, flags)
+    return not flags
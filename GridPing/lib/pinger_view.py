@@ -0,0 +1,42 @@
+from PySide6.QtWidgets import QWidget, QPushButton, QLabel, QVBoxLayout, QApplication
+import sys
+from multiprocessing import Pipe
+from lib.pinger import Pinger
+from lib.util import RequestData
+from lib import wire
+
+class PingerView(QWidget):
+  def __init__(self, parent=None):
+    super(PingerView, self).__init__(parent)
+    self.state = 0
+    layout = QVBoxLayout()
+    self.btn_start_stop = QPushButton("Start Pinging")
+    self.lbl_output = QLabel()
+    self.btn_start_stop.clicked.connect(self.controlThread)
+    layout.addWidget(self.btn_start_stop)
+    layout.addWidget(self.lbl_output)
+    self.setLayout(layout)
+    
+  def createPingerThread(self):
+    req_data = RequestData(100, 1000, 1000, 3)
+    self.receive_pipe, send_pipe =  Pipe(duplex=False)
+    self.pinger_process = Pinger(["www.google.com"], req_data, send_pipe)
+
+  def controlThread(self):
+    if self.state == 0:
+      self.createPingerThread()
+      self.state = 1
+      self.btn_start_stop.setText("Stop Pinging")
+      self.pinger_process.start()
+      frame = self.receive_pipe.recv_bytes()
+      self.lbl_output.setText(str(list(wire.iterRecords(frame))))
+      self.pinger_process.terminate()
+      self.pinger_process.wait()
+      self.state = 0
+      self.btn_start_stop.setText("Start Pinging")
+      
+if __name__ == "__main__":
+  app = QApplication(sys.argv)
+  main = PingerView()
+  main.show()
+  sys.exit(app.exec())
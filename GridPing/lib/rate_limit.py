@@ -0,0 +1,104 @@
+"""
+Global send rate limits, shared by every pinger process of a scan.
+"""
+from __future__ import division
+import time, asyncio
+from collections import deque
+from multiprocessing import Array
+from lib.util import WIRE_OVERHEAD
+
+class RateLimiter(object):
+  """
+  Two token buckets, packets per second and bytes per second (payload plus
+  WIRE_OVERHEAD), whose state lives in shared memory so one limit holds
+  across all the worker processes it's handed to. A rate of 0 is unlimited.
+  A worker doesn't touch the shared buckets per packet: it takes BATCH_TIME
+  worth of tokens at once and spends them locally. Buckets hold at most
+  BURST_TIME worth of tokens, so an idle spell doesn't turn into a flood.
+  """
+  BATCH_TIME = 0.005 #seconds of tokens a worker takes from the shared buckets at once
+  BURST_TIME = 0.05
+  def __init__(self, packetRate=0, byteRate=0):
+    super(RateLimiter, self).__init__()
+    self.packet_rate = packetRate
+    self.byte_rate = byteRate
+    #packet tokens, byte tokens, time of the last refill
+    self._shared = Array('d', [0.0, 0.0, time.monotonic()])
+    self._local = [0.0, 0.0]
+
+  @classmethod
+  def forRequest(cls, reqData):
+    """
+    A limiter for the rates reqData asks for, None when it's unlimited
+    """
+    if not reqData.packet_rate and not reqData.byte_rate:
+      return None
+    return cls(reqData.packet_rate, reqData.byte_rate)
+
+  def _costs(self, size):
+    return (1 if self.packet_rate else 0,
+            size + WIRE_OVERHEAD if self.byte_rate else 0)
+
+  def tryTake(self, size):
+    """
+    Take the tokens for one packet of size bytes. Returns 0 when they were
+    taken, otherwise how long to wait before there may be enough.
+    """
+    costs = self._costs(size)
+    if self._local[0] >= costs[0] and self._local[1] >= costs[1]:
+      self._local[0] -= costs[0]
+      self._local[1] -= costs[1]
+      return 0
+    rates = (self.packet_rate, self.byte_rate)
+    wait = 0
+    with self._shared.get_lock():
+      now = time.monotonic()
+      elapsed = max(0, now - self._shared[2])
+      self._shared[2] = now
+      for i in (0, 1):
+        if not rates[i]:
+          continue
+        capacity = max(rates[i] * self.BURST_TIME, costs[i])
+        self._shared[i] = min(capacity, self._shared[i] + elapsed * rates[i])
+        wanted = max(costs[i] - self._local[i], rates[i] * self.BATCH_TIME)
+        granted = min(wanted, self._shared[i])
+        self._shared[i] -= granted
+        self._local[i] += granted
+        if self._local[i] < costs[i]:
+          wait = max(wait, (costs[i] - self._local[i]) / rates[i])
+    if wait:
+      return wait
+    self._local[0] -= costs[0]
+    self._local[1] -= costs[1]
+    return 0
+
+  async def take(self, size):
+    while True:
+      wait = self.tryTake(size)
+      if not wait:
+        return
+      await asyncio.sleep(wait)
+
+
+class RateMeter(object):
+  """
+  Rate of whatever is counted in, over the last `window` seconds
+  """
+  def __init__(self, window=1.0):
+    super(RateMeter, self).__init__()
+    self.window = window
+    self.total = 0
+    self._marks = deque([(time.monotonic(), 0)])
+
+  def add(self, count):
+    now = time.monotonic()
+    self.total += count
+    self._marks.append((now, self.total))
+    #keep one mark older than the window, the rate is measured from it
+    while len(self._marks) > 2 and now - self._marks[1][0] >= self.window:
+      self._marks.popleft()
+
+  def rate(self):
+    start, start_total = self._marks[0]
+    elapsed = time.monotonic() - start
+    return (self.total - start_total) / elapsed if elapsed > 0 else 0
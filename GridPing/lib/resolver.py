@@ -0,0 +1,100 @@
+"""
+Hostname lookups for the pinger, done once per name rather than per packet.
+"""
+import time, socket, asyncio
+from collections import OrderedDict
+from lib.targets import IP_REGEXP
+
+class ResolverCache(object):
+  """
+  Bounded cache of hostname -> address with a time to live.
+  Lookups run on the event loop (getaddrinfo in the loop's executor), at most
+  `concurrency` of them at a time, and concurrent requests for the same name
+  share one lookup. getaddrinfo doesn't give the record's TTL, so entries
+  live `ttl` seconds; the least recently used entry is dropped when full.
+  Each process keeps one cache (see sharedCache), so it carries over from
+  round to round; the sharded pinger hands each target to a single worker,
+  so workers don't look the same name up twice.
+  """
+  def __init__(self, maxEntries=4096, ttl=300, concurrency=32):
+    super(ResolverCache, self).__init__()
+    self.max_entries = maxEntries
+    self.ttl = ttl
+    self.concurrency = concurrency
+    self._entries = OrderedDict() #name -> (address, expiry)
+    self._inflight = {} #name -> future of the lookup running for it
+    self._slots = None
+    self.lookups = 0
+    self.hits = 0
+
+  def lookup(self, name):
+    """
+    The cached address of name, None if it's unknown or expired
+    """
+    entry = self._entries.get(name)
+    if entry is None:
+      return None
+    if entry[1] < time.time():
+      del self._entries[name]
+      return None
+    self._entries.move_to_end(name)
+    return entry[0]
+
+  def store(self, name, address):
+    self._entries[name] = (address, time.time() + self.ttl)
+    self._entries.move_to_end(name)
+    while len(self._entries) > self.max_entries:
+      self._entries.popitem(last=False)
+
+  async def resolve(self, name):
+    """
+    Returns (address, seconds spent looking it up); the time is 0 for ip
+    literals and cache hits. Raises socket.error when the name doesn't resolve.
+    """
+    if IP_REGEXP.match(name):
+      return name, 0
+    address = self.lookup(name)
+    if address is not None:
+      self.hits += 1
+      return address, 0
+    future = self._inflight.get(name)
+    if future is not None: #somebody is already looking it up
+      return await asyncio.shield(future), 0
+    loop = asyncio.get_event_loop()
+    future = self._inflight[name] = loop.create_future()
+    if self._slots is None:
+      self._slots = asyncio.Semaphore(self.concurrency)
+    try:
+      async with self._slots:
+        start = time.perf_counter()
+        info = await loop.getaddrinfo(name, None, family=socket.AF_INET, type=socket.SOCK_RAW)
+        spent = time.perf_counter() - start
+      address = info[0][4][0]
+      self.lookups += 1
+      self.store(name, address)
+      future.set_result(address)
+      return address, spent
+    except BaseException as e:
+      future.set_exception(e)
+      future.exception() #retrieved, so a lookup nobody else waited on doesn't get logged
+      raise
+    finally:
+      del self._inflight[name]
+
+  def reset(self):
+    """
+    Forget the event loop bound state, for a cache reused on a new loop
+    """
+    self._slots = None
+    self._inflight = {}
+
+_shared_cache = None
+
+def sharedCache():
+  """
+  The cache of this process
+  """
+  global _shared_cache
+  if _shared_cache is None:
+    _shared_cache = ResolverCache()
+  return _shared_cache
@@ -0,0 +1,129 @@
+from __future__ import division
+import numpy as np
+from lib import wire
+
+#the layout of a wire record, so frames can be read without unpacking record by record
+RECORD_DTYPE = np.dtype([("index", "<u4"), ("timestamp", "<i8"), ("size", "<u4"),
+                         ("rtt", "<f4"), ("flags", "u1")])
+assert RECORD_DTYPE.itemsize == wire.RECORD.size
+
+def frameRecords(frame):
+  """
+  The records of a frame as a structured numpy array (no copy)
+  """
+  return np.frombuffer(frame, RECORD_DTYPE, count=wire.recordCount(frame), offset=wire.HEADER.size)
+
+
+class ResultStore(object):
+  """
+  Keeps every packet sample of a scan in preallocated columns that grow
+  CHUNK_SIZE samples at a time:
+    host      -- host index (uint32)
+    rtt       -- round trip time in ms (float32), NaN for a lost packet, so
+                 the column doubles as the loss bitmap
+    timestamp -- ms since the epoch (int64)
+  Per host queries are answered with whole-array numpy operations.
+  With maxSamples, only about the newest maxSamples samples are kept (the
+  oldest are dropped an eighth of that at a time), for runs with no end.
+  """
+  CHUNK_SIZE = 1 << 16
+
+  def __init__(self, hostCount=0, maxSamples=None):
+    super(ResultStore, self).__init__()
+    self.host_count = hostCount
+    self.max_samples = maxSamples
+    self.dropped = 0 #samples let go to stay under max_samples
+    self.count = 0
+    self.host = np.empty(self.CHUNK_SIZE, np.uint32)
+    self.rtt = np.empty(self.CHUNK_SIZE, np.float32)
+    self.timestamp = np.empty(self.CHUNK_SIZE, np.int64)
+
+  def capacity(self):
+    return len(self.host)
+
+  def reserve(self, extra):
+    needed = self.count + extra
+    if needed <= self.capacity():
+      return
+    capacity = -(-needed // self.CHUNK_SIZE) * self.CHUNK_SIZE
+    for name in ("host", "rtt", "timestamp"):
+      old = getattr(self, name)
+      new = np.empty(capacity, old.dtype)
+      new[:self.count] = old[:self.count]
+      setattr(self, name, new)
+
+  def dropOldest(self, count):
+    count = min(count, self.count)
+    for name in ("host", "rtt", "timestamp"):
+      column = getattr(self, name)
+      column[:self.count - count] = column[count:self.count]
+    self.count -= count
+    self.dropped += count
+
+  def append(self, hosts, rtts, lost, timestamps):
+    n = len(hosts)
+    if self.max_samples is not None and self.count + n > self.max_samples:
+      self.dropOldest(max(self.count + n - self.max_samples, self.max_samples // 8))
+    self.reserve(n)
+    end = self.count + n
+    self.host[self.count:end] = hosts
+    self.rtt[self.count:end] = np.where(lost, np.nan, rtts)
+    self.timestamp[self.count:end] = timestamps
+    self.count = end
+
+  def appendFrame(self, frame):
+    records = frameRecords(frame)
+    self.append(records["index"], records["rtt"], records["flags"] & wire.FLAG_LOST,
+                records["timestamp"])
+
+  def samples(self):
+    """Views of the filled part of the columns: host, rtt, timestamp"""
+    return self.host[:self.count], self.rtt[:self.count], self.timestamp[:self.count]
+
+  def lossMask(self):
+    return np.isnan(self.rtt[:self.count])
+
+  def lossBitmap(self):
+    return np.packbits(self.lossMask())
+
+  def sentCounts(self):
+    return np.bincount(self.host[:self.count], minlength=self.host_count)
+
+  def lostCounts(self):
+    return np.bincount(self.host[:self.count], weights=self.lossMask(), minlength=self.host_count)
+
+  def lossRates(self):
+    """Per host fraction of packets lost, NaN for hosts without samples"""
+    sent = self.sentCounts()
+    with np.errstate(invalid="ignore", divide="ignore"):
+      return self.lostCounts() / sent
+
+  def hostsWithLossAbove(self, percentage):
+    with np.errstate(invalid="ignore"):
+      return np.flatnonzero(self.lossRates() * 100 > percentage)
+
+  def meanRtts(self):
+    host, rtt, _ = self.samples()
+    received = ~np.isnan(rtt)
+    counts = np.bincount(host[received], minlength=self.host_count)
+    sums = np.bincount(host[received], weights=rtt[received], minlength=self.host_count)
+    with np.errstate(invalid="ignore", divide="ignore"):
+      return sums / counts
+
+  def rttPercentiles(self, q):
+    """
+    Per host q-th percentile (nearest rank) of the rtt of received packets,
+    NaN for hosts that never answered
+    """
+    host, rtt, _ = self.samples()
+    received = ~np.isnan(rtt)
+    host = host[received]; rtt = rtt[received]
+    order = np.lexsort((rtt, host)) #by host, then by rtt within each host
+    host = host[order]; rtt = rtt[order]
+    counts = np.bincount(host, minlength=self.host_count)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    result = np.full(self.host_count, np.nan, np.float32)
+    answered = counts > 0
+    ranks = starts[answered] + np.floor(q / 100 * (counts[answered] - 1)).astype(np.int64)
+    result[answered] = rtt[ranks]
+    return result
@@ -0,0 +1,111 @@
+"""
+Adaptive probe timeouts, worked out the way TCP works out its retransmission
+timeout (RFC 6298) from the rtts seen so far.
+"""
+from __future__ import division
+from lib.targets import ipToInt
+
+class RttEstimate(object):
+  """
+  Smoothed rtt and rtt variation of a stream of samples, in ms
+  """
+  __slots__ = ("srtt", "rttvar")
+  ALPHA = 1 / 8
+  BETA = 1 / 4
+  K = 4
+  GRANULARITY = 1 #ms, the smallest variation term of the timeout
+  def __init__(self):
+    self.srtt = None
+    self.rttvar = None
+
+  def add(self, rtt):
+    if self.srtt is None:
+      self.srtt = rtt
+      self.rttvar = rtt / 2
+    else:
+      self.rttvar += self.BETA * (abs(self.srtt - rtt) - self.rttvar)
+      self.srtt += self.ALPHA * (rtt - self.srtt)
+
+  def timeout(self):
+    return self.srtt + max(self.GRANULARITY, self.K * self.rttvar)
+
+
+class AdaptiveTimeouts(object):
+  """
+  Picks the timeout of every probe from rtt estimates kept per host, per
+  subnet (/24 by default) and over the whole scan, never above maxTimeout
+  (the configured timeout) or below MIN_TIMEOUT.
+  A host with replies of its own gets its own timeout. A host that hasn't
+  answered yet borrows its subnet's, or failing that the scan's, with a
+  safety margin; that's what cuts the time spent on empty address space.
+  A borrowed timeout says nothing about the host itself though, so the
+  pinger doesn't count a probe lost on one: it probes the host again with
+  the configured timeout (see Pinger.sendPacket). Borrowed timeouts
+  are never below BORROWED_MIN_TIMEOUT.
+  Every timeout in a row doubles the host's next one (TCP's backoff).
+  Hosts are forgotten once they're done.
+  """
+  MIN_TIMEOUT = 50 #ms
+  BORROWED_MIN_TIMEOUT = 500 #ms
+  SUBNET_MARGIN = 2
+  SCAN_MARGIN = 4
+  MAX_BACKOFF = 16 #doublings, well past any configured timeout
+  def __init__(self, maxTimeout, subnetBits=24):
+    super(AdaptiveTimeouts, self).__init__()
+    self.max_timeout = maxTimeout
+    self.subnet_shift = 32 - subnetBits
+    self._hosts = {} #index -> [RttEstimate or None, timeouts in a row]
+    self._subnets = {} #address >> subnet_shift -> RttEstimate
+    self._scan = RttEstimate()
+
+  def subnetOf(self, ip):
+    try:
+      return ipToInt(ip) >> self.subnet_shift
+    except ValueError: #a hostname the backend handles itself
+      return None
+
+  def timeoutFor(self, index, ip):
+    estimate, backoff = self._hosts.get(index, (None, 0))
+    if estimate is not None:
+      timeout = max(self.MIN_TIMEOUT, estimate.timeout())
+    else:
+      subnet = self._subnets.get(self.subnetOf(ip))
+      if subnet is not None:
+        timeout = subnet.timeout() * self.SUBNET_MARGIN
+      elif self._scan.srtt is not None:
+        timeout = self._scan.timeout() * self.SCAN_MARGIN
+      else:
+        return self.max_timeout
+      timeout = max(self.BORROWED_MIN_TIMEOUT, timeout)
+    return min(self.max_timeout, timeout * 2 ** backoff)
+
+  def hasEstimate(self, index):
+    """
+    Whether the host's timeouts are its own, rather than borrowed
+    """
+    return self._hosts.get(index, (None, 0))[0] is not None
+
+  def update(self, index, ip, rtt):
+    """
+    rtt is None for a probe that timed out
+    """
+    host = self._hosts.get(index)
+    if host is None:
+      host = self._hosts[index] = [None, 0]
+    if rtt is None:
+      host[1] = min(host[1] + 1, self.MAX_BACKOFF)
+      return
+    host[1] = 0
+    if host[0] is None:
+      host[0] = RttEstimate()
+    host[0].add(rtt)
+    key = self.subnetOf(ip)
+    if key is not None:
+      subnet = self._subnets.get(key)
+      if subnet is None:
+        subnet = self._subnets[key] = RttEstimate()
+      subnet.add(rtt)
+    self._scan.add(rtt)
+
+  def forget(self, index):
+    self._hosts.pop(index, None)
@@ -0,0 +1,130 @@
+"""
+Interleaves the packets of many hosts on the pinger's event loop.
+A host only holds a probe slot while one of its packets is in flight; the
+wait between two of its packets is spent sending to other hosts. So a scan
+takes about as long as probing one host, rather than that times the number
+of hosts over the concurrency.
+"""
+import asyncio
+from collections import deque
+from lib.timer_wheel import TimerWheel
+
+class ScheduledHost(object):
+  """
+  A host being pinged, as the scheduler and the pinger see it
+  """
+  __slots__ = ("index", "ip", "sent", "due", "suspect")
+  def __init__(self, index, ip):
+    self.index = index
+    self.ip = ip
+    self.sent = 0
+    self.due = None #loop time its last packet was due
+    self.suspect = False #its first probe went unanswered, the next one tells if it's dead
+
+
+class PacketScheduler(object):
+  """
+  Hosts are admitted (admit, then add), up to maxActive at a time, and their
+  next packet waits on a TimerWheel until it's due. Due packets are sent, at
+  most concurrency at once, through
+    await send(host) -> True if the host has more packets to send
+  With a throttle, every send first waits on
+    await throttle(host)
+  (a rate limit, say), holding up the packets due after it.
+  Sends run on absolute deadlines: a host's next packet is due delay()
+  seconds after its previous one was due, so the spacing follows the delay
+  distribution without the drift of sleeping after every reply. A packet
+  can't go out before the previous one's reply (or timeout) is in though;
+  a host that fell behind sends as soon as it can, it doesn't catch up.
+  run() returns once close() was called and every admitted host is done.
+  """
+  def __init__(self, send, delay, concurrency, maxActive, throttle=None):
+    super(PacketScheduler, self).__init__()
+    self.send = send
+    self.delay = delay
+    self.throttle = throttle
+    self._loop = asyncio.get_event_loop()
+    self._wheel = TimerWheel(self._loop.time())
+    self._ready = deque() #hosts whose packet is due, waiting for a slot
+    self._slots = asyncio.Semaphore(concurrency)
+    self._admission = asyncio.Semaphore(maxActive)
+    self._active = 0 #admitted and not done yet
+    self._closed = False
+    self._error = None
+    self._wakeup = None
+
+  async def admit(self):
+    """
+    Wait for room in the active window; the host must be added afterwards
+    """
+    await self._admission.acquire()
+    self._active += 1
+
+  def add(self, host, due=None):
+    """
+    Schedule the next packet of an admitted host, now unless due is given
+    (in loop time)
+    """
+    if due is None:
+      host.due = self._loop.time()
+      self._ready.append(host)
+    else:
+      host.due = due
+      self._wheel.schedule(due, host)
+    self._wake()
+
+  def close(self):
+    """
+    No more hosts will be admitted
+    """
+    self._closed = True
+    self._wake()
+
+  def _wake(self):
+    if self._wakeup is not None and not self._wakeup.done():
+      self._wakeup.set_result(None)
+
+  async def _sleep(self, seconds=None):
+    """
+    Sleep until seconds passed or something changed, whichever comes first
+    """
+    self._wakeup = self._loop.create_future()
+    timer = self._loop.call_later(seconds, self._wake) if seconds is not None else None
+    try:
+      await self._wakeup
+    finally:
+      if timer is not None:
+        timer.cancel()
+      self._wakeup = None
+
+  async def run(self):
+    while self._active or not self._closed:
+      if self._error is not None:
+        raise self._error
+      self._ready.extend(self._wheel.advance(self._loop.time()))
+      if not self._ready:
+        deadline = self._wheel.nextDeadline()
+        await self._sleep(None if deadline is None else max(0, deadline - self._loop.time()))
+        continue
+      await self._slots.acquire()
+      host = self._ready.popleft()
+      if self.throttle is not None:
+        await self.throttle(host)
+      asyncio.ensure_future(self._sendPacket(host))
+    if self._error is not None:
+      raise self._error
+
+  async def _sendPacket(self, host):
+    try:
+      more = await self.send(host)
+    except Exception as e: #surfaced by run()
+      self._error = e
+      more = False
+    finally:
+      self._slots.release()
+    if more:
+      self.add(host, max(host.due + self.delay(), self._loop.time()))
+    else:
+      self._active -= 1
+      self._admission.release()
+      self._wake()
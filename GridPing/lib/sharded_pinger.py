@@ -0,0 +1,134 @@
+from multiprocessing import Pipe, Process, cpu_count
+from collections import deque
+from lib.pinger import Pinger
+from lib.rate_limit import RateLimiter
+from lib import wire
+
+class Shard(object):
+  """
+  One worker process and the pipe its replies come back on
+  """
+  def __init__(self, ipList, indexList, reqData, rateLimiter=None):
+    self.indices = indexList
+    self.receive_pipe, self.send_pipe = Pipe(duplex=False)
+    self.pinger = Pinger(ipList, reqData, self.send_pipe, indexList, rateLimiter)
+    self.process = Process(target=self.pinger.run)
+    self.done = False
+    self.failed = False
+
+  def start(self):
+    self.process.start()
+    #drop our copy of the sending end, so a dead worker shows up as EOF on the pipe
+    self.send_pipe.close()
+
+
+class ShardedPinger(object):
+  """
+  Splits the ip list across several pinger processes and merges their
+  reply streams back into a single feed.
+  To the gui it looks like the receiving end of the reply pipe (poll/recv_bytes),
+  so it can be read the same way. Frames come out in arrival order, their
+  records tagged with the host index in the full list. The final frame is only
+  produced after every shard finished or died; failed_indices lists the hosts
+  assigned to workers that died, the gui knows which of those got replies.
+  The rate limits of reqData hold for all the workers together, they share
+  one RateLimiter.
+  When the workers run rounds, their FRAME_ROUND markers are merged too: the
+  feed gets a round's marker once every live worker is through that round.
+  """
+  COLLECT_BATCH = 16 #frames, each up to wire.BATCH_SIZE records
+  def __init__(self, ipList, reqData, workerCount=None):
+    super(ShardedPinger, self).__init__()
+    if not workerCount:
+      workerCount = cpu_count()
+    workerCount = max(1, min(workerCount, len(ipList)))
+    self.rate_limiter = RateLimiter.forRequest(reqData)
+    #stride the list so every worker gets a similar mix of the range
+    self._shards = [Shard(ipList[i::workerCount], range(i, len(ipList), workerCount), reqData,
+                          self.rate_limiter)
+                    for i in range(workerCount)]
+    self._ready = deque()
+    self._finished = False
+    self._rounds = {} #round number -> workers through it
+
+  def start(self):
+    for shard in self._shards:
+      shard.start()
+
+  def terminate(self):
+    for shard in self._shards:
+      shard.process.terminate()
+
+  def join(self):
+    for shard in self._shards:
+      shard.process.join()
+      shard.receive_pipe.close()
+
+  def poll(self):
+    if not self._ready:
+      self._collect()
+    return len(self._ready) > 0
+
+  def recv_bytes(self):
+    if not self._ready:
+      self._collect()
+    return self._ready.popleft()
+
+  def workerCount(self):
+    return len(self._shards)
+
+  def liveFilenos(self):
+    """
+    File descriptors of the shards still sending, for the gui to watch
+    """
+    return [shard.receive_pipe.fileno() for shard in self._shards if not shard.done]
+
+  def _collect(self):
+    """
+    Move at most COLLECT_BATCH frames per shard into the merged feed,
+    so a single call never blocks the caller for long
+    """
+    for shard in self._shards:
+      if shard.done:
+        continue
+      try:
+        for i in range(self.COLLECT_BATCH):
+          if not shard.receive_pipe.poll():
+            break
+          frame = shard.receive_pipe.recv_bytes()
+          if wire.frameType(frame) == wire.FRAME_FINAL:
+            shard.done = True
+            break
+          if wire.frameType(frame) == wire.FRAME_ROUND:
+            self._roundDone(frame)
+            continue
+          self._ready.append(frame)
+      except (EOFError, IOError): #the worker died on us
+        self._shardFailed(shard)
+        continue
+      if not shard.done and not shard.process.is_alive() and not shard.receive_pipe.poll():
+        self._shardFailed(shard)
+    if not self._finished and all(shard.done for shard in self._shards):
+      self._finished = True
+      self._ready.append(wire.encodeFrame(wire.FRAME_FINAL))
+
+  def _roundDone(self, frame):
+    for round_number, timestamp in wire.iterRecords(frame):
+      self._rounds[round_number] = self._rounds.get(round_number, 0) + 1
+    live = sum(1 for shard in self._shards if not shard.failed)
+    for round_number in sorted(self._rounds):
+      if self._rounds[round_number] < live:
+        break
+      del self._rounds[round_number]
+      self._ready.append(wire.encodeFrame(wire.FRAME_ROUND, 1,
+                                          wire.ROUND_RECORD.pack(round_number, wire.now())))
+
+  def _shardFailed(self, shard):
+    shard.done = True
+    shard.failed = True
+
+  def failedIndices(self):
+    for shard in self._shards:
+      if shard.failed:
+        for i in shard.indices:
+          yield i
@@ -0,0 +1,139 @@
+from __future__ import division
+import math
+
+class RunningStats(object):
+  """
+  Constant memory running statistics of a stream of rtt samples.
+  Mean and variance are kept with Welford's method, so they stay accurate
+  over millions of samples. Jitter is the mean absolute difference between
+  consecutive rtts of the same host, fed in through addJitter.
+  Two RunningStats can be merged, e.g. ones collected by different workers.
+  """
+  def __init__(self):
+    super(RunningStats, self).__init__()
+    self.count = 0
+    self.mean = 0.0
+    self._m2 = 0.0
+    self.min = float("inf")
+    self.max = float("-inf")
+    self._jitter_count = 0
+    self._jitter_sum = 0.0
+
+  def add(self, x):
+    self.count += 1
+    delta = x - self.mean
+    self.mean += delta / self.count
+    self._m2 += delta * (x - self.mean)
+    if x < self.min:
+      self.min = x
+    if x > self.max:
+      self.max = x
+
+  def addJitter(self, difference):
+    self._jitter_count += 1
+    self._jitter_sum += abs(difference)
+
+  @classmethod
+  def fromMoments(cls, count, moments):
+    """
+    Stats of count samples from what moments() returned for them, no jitter
+    """
+    stats = cls()
+    if count:
+      stats.count = count
+      stats.mean, stats._m2, stats.min, stats.max = moments
+    return stats
+
+  def moments(self):
+    """
+    (mean, m2, min, max), all merge() needs of the samples besides their count
+    """
+    if not self.count:
+      return 0.0, 0.0, 0.0, 0.0
+    return self.mean, self._m2, self.min, self.max
+
+  def merge(self, other):
+    if not other.count:
+      return
+    count = self.count + other.count
+    delta = other.mean - self.mean
+    self._m2 += other._m2 + delta * delta * self.count * other.count / count
+    self.mean += delta * other.count / count
+    self.count = count
+    self.min = min(self.min, other.min)
+    self.max = max(self.max, other.max)
+    self._jitter_count += other._jitter_count
+    self._jitter_sum += other._jitter_sum
+
+  def variance(self):
+    return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+  def stddev(self):
+    return math.sqrt(self.variance())
+
+  def jitter(self):
+    return self._jitter_sum / self._jitter_count if self._jitter_count else 0.0
+
+
+class QuantileSketch(object):
+  """
+  Mergeable quantile sketch with a relative error bound (the DDSketch idea).
+  Samples are counted in logarithmically sized buckets, bucket k holding
+  values in (gamma^(k-1), gamma^k], so any quantile comes back within
+  relativeAccuracy of the true value whatever the number of samples.
+  Adding is O(1); memory only grows with the spread of the values
+  (about 800 buckets between 10us and a minute at 1%).
+  """
+  MIN_VALUE = 1e-3 #ms, anything below is counted as zero
+
+  def __init__(self, relativeAccuracy=0.01):
+    super(QuantileSketch, self).__init__()
+    self.relative_accuracy = relativeAccuracy
+    self.gamma = (1 + relativeAccuracy) / (1 - relativeAccuracy)
+    self._log_gamma = math.log(self.gamma)
+    self.buckets = {}
+    self.zero_count = 0
+    self.count = 0
+
+  def add(self, x):
+    self.count += 1
+    if x < self.MIN_VALUE:
+      self.zero_count += 1
+      return
+    k = int(math.ceil(math.log(x) / self._log_gamma))
+    self.buckets[k] = self.buckets.get(k, 0) + 1
+
+  def merge(self, other):
+    if other.gamma != self.gamma:
+      raise ValueError("Can't merge sketches with different accuracies")
+    self.count += other.count
+    self.zero_count += other.zero_count
+    for k, n in other.buckets.items():
+      self.buckets[k] = self.buckets.get(k, 0) + n
+
+  def quantile(self, q):
+    """
+    q is in [0, 1], returns 0 for an empty sketch
+    """
+    return self.quantiles([q])[0]
+
+  def quantiles(self, qs):
+    """
+    Several quantiles in one pass over the buckets, qs sorted ascending
+    """
+    result = []
+    if not self.count:
+      return [0.0] * len(qs)
+    keys = sorted(self.buckets)
+    seen = self.zero_count
+    i = 0
+    for q in qs:
+      rank = q * (self.count - 1)
+      while rank >= seen and i < len(keys):
+        seen += self.buckets[keys[i]]
+        i += 1
+      if i == 0 or rank < self.zero_count:
+        result.append(0.0)
+      else:
+        result.append(2 * self.gamma ** keys[i - 1] / (self.gamma + 1))
+    return result
@@ -1,62 +1,246 @@
-from PySide.QtGui import QWidget, QTabWidget, QTextEdit, QLabel, QFrame, QVBoxLayout
-from PySide.QtGui import QHBoxLayout, QFormLayout, QGridLayout, QStackedLayout
+from __future__ import division
+from PySide6.QtWidgets import QWidget, QTabWidget, QLabel, QFrame, QVBoxLayout
+from PySide6.QtWidgets import QHBoxLayout, QFormLayout, QGridLayout, QStackedLayout, QStackedWidget
 from lib.dynamic_grid import BallGrid
+from lib.led_grid import LedGridView
 from lib.indicator_ball import BallWidget
+from lib.output_log import OutputLogView
+from lib.event_log import EventLogView
 from lib.util import SummaryData
+from lib import wire
+from lib.result_store import ResultStore
+from lib.window_stats import WindowStats
+from lib.stats import RunningStats, QuantileSketch
+from array import array
 
 class SummarySection(QTabWidget):
   """
   Represents the summary section.
   Takes reply data from main ui and updates it's tabs
   Keeps track of cumulative summary data.
+  Replies are only folded into the accumulators as they come in (takeReplyFrame);
+  the widgets catch up on refresh(), which the main window calls at a fixed
+  frame rate, so the gui cost follows the frame rate and not the reply rate.
+  Above LED_WIDGET_LIMIT hosts, the led tab switches from a widget per
+  host (BallGrid) to the single widget LedGridView.
+  When monitoring in rounds, the per host accumulators hold the current
+  round, the leds show every host's last round, the statistics over the last
+  minutes come from WindowStats and the sample store keeps MONITOR_SAMPLES.
+  Pingers that only report changes send the hosts that went up or down to
+  the events tab, and the counts of the hosts they held back as totals.
   """
+  LED_WIDGET_LIMIT = 1024
+  LOSSY_PERCENTAGE = 10 #hosts losing more than this are reported when pinging is done
+  MONITOR_SAMPLES = 1 << 21 #newest samples kept when monitoring, 16 bytes each
+  WINDOW_SUMMARY_INTERVAL = 1000 #ms between two sums over the window
   def __init__(self, parent=None):
     super(SummarySection, self).__init__(parent)
-    self.text_edit_summary = QTextEdit()
-    self.text_edit_summary.setReadOnly(True)
-    self.addTab(self.text_edit_summary, "Output")
+    self.output_log = OutputLogView()
+    self.addTab(self.output_log, "Output")
     self.ball_grid = BallGrid(30, 30, 2)
-    self.addTab(self.ball_grid, "Led View")
+    self.led_grid = LedGridView(12, 12, 2)
+    self.led_stack = QStackedWidget()
+    self.led_stack.addWidget(self.ball_grid)
+    self.led_stack.addWidget(self.led_grid)
+    self.led_view = self.ball_grid #whichever of the two is showing the current ips
+    self.addTab(self.led_stack, "Led View")
     self.tab_summary = SummaryTab()
     self.addTab(self.tab_summary, "Summary")
+    self.event_log = EventLogView()
+    self.addTab(self.event_log, "Events")
     #some private fields, keep track of accumulated summary data
-    self.current_ip = 0 #we take reply data for ips in order
     self.sent_packets = 0
     self.received_packets = 0
-    self.average_delay = 0
+    self.rtt_stats = RunningStats()
+    self.rtt_sketch = QuantileSketch()
+    self.resolve_stats = RunningStats() #name lookup times, kept apart from the rtt
+    self.pending_states = {} #host index -> led state, waiting for the next refresh
+    self.dirty = False #something changed since the last refresh
+    self.done_hosts = 0
+    self.done_packets = 0 #packets the finished hosts got, less than asked for with early stopping
+    self.window_stats = None
     
-  def setIPs(self, ips):
+  def setIPs(self, ips, reqData=None):
     #this indicates the start of a new ping, could be treated
     #as a pingStarted signal
-    self.current_ip = 0
+    self.ips = ips
     self.sent_packets = 0
     self.received_packets = 0
-    self.average_delay = 0
-    self.text_edit_summary.clear()
-    self.ball_grid.layoutForIps(ips)
+    self.rtt_stats = RunningStats()
+    self.rtt_sketch = QuantileSketch()
+    self.resolve_stats = RunningStats()
+    self.pending_states = {}
+    self.dirty = False
+    self.done_hosts = 0
+    self.done_packets = 0
+    #per host accumulators, filled in from the wire records as packets come back
+    self.host_sent = array('I', [0]) * len(ips)
+    self.host_lost = array('I', [0]) * len(ips)
+    self.host_size = array('I', [0]) * len(ips)
+    self.host_rtt = array('d', [0]) * len(ips)
+    self.host_last_rtt = array('d', [-1]) * len(ips) #for the jitter, -1 until a host answers
+    self.host_done = bytearray(len(ips))
+    if reqData is not None and reqData.round_period:
+      self.result_store = ResultStore(len(ips), self.MONITOR_SAMPLES)
+      self.window_stats = WindowStats(len(ips), reqData.stats_window)
+    else: #every sample, for queries over the whole scan
+      self.result_store = ResultStore(len(ips))
+      self.window_stats = None
+    self.window_summary = None
+    self.window_summary_time = 0
+    self.output_log.setIps(ips)
+    self.event_log.setIps(ips)
+    self.led_view.clear()
+    if len(ips) > self.LED_WIDGET_LIMIT:
+      self.led_view = self.led_grid
+    else:
+      self.led_view = self.ball_grid
+    self.led_stack.setCurrentWidget(self.led_view)
+    self.led_view.layoutForIps(ips)
     self.tab_summary.zeroOut()
   
-  def takeReplyData(self, replyData, sentPackets): #sent packets is passed in as extra
+  def takeReplyFrame(self, frame):
+    """
+    Fold a frame of packet records (see lib.wire) into the per host accumulators
+    and the streaming rtt statistics, O(1) per packet.
+    Hosts whose last packet is in the frame get their output line and ball
+    state queued, the widgets are only touched on refresh().
+    Returns the number of hosts completed by this frame.
+    """
+    self.dirty = True
+    if wire.frameType(frame) == wire.FRAME_RESOLVE:
+      for index, ms in wire.iterRecords(frame):
+        self.resolve_stats.add(ms)
+      return 0
+    if wire.frameType(frame) == wire.FRAME_TRANSITION:
+      for index, timestamp, state in wire.iterRecords(frame):
+        self.event_log.append(index, timestamp, state)
+      return 0
+    if wire.frameType(frame) == wire.FRAME_TOTALS:
+      return self.takeTotals(frame)
+    if wire.frameType(frame) != wire.FRAME_RECORDS:
+      return 0
+    self.result_store.appendFrame(frame)
+    if self.window_stats is not None:
+      self.window_stats.addFrame(frame)
+    hosts_done = 0
+    host_sent = self.host_sent; host_lost = self.host_lost
+    host_size = self.host_size; host_rtt = self.host_rtt
+    host_last_rtt = self.host_last_rtt
+    rtt_stats = self.rtt_stats; rtt_sketch = self.rtt_sketch
+    for index, timestamp, size, rtt, flags in wire.iterRecords(frame):
+      host_sent[index] += 1
+      self.sent_packets += 1
+      if flags & wire.FLAG_LOST:
+        host_lost[index] += 1
+      else:
+        self.received_packets += 1
+        host_size[index] += size
+        host_rtt[index] += rtt
+        rtt_stats.add(rtt)
+        rtt_sketch.add(rtt)
+        if host_last_rtt[index] >= 0:
+          rtt_stats.addJitter(rtt - host_last_rtt[index])
+        host_last_rtt[index] = rtt
+      if flags & wire.FLAG_HOST_DONE:
+        self.hostDone(index, timestamp)
+        hosts_done += 1
+    return hosts_done
+
+  def takeTotals(self, frame):
+    """
+    Fold in the counts of the hosts a change-only pinger held back, their
+    leds and output lines stay as they were
+    """
+    hosts_done = 0
+    for hosts, sent, lost, mean, m2, rtt_min, rtt_max in wire.iterRecords(frame):
+      rtts = RunningStats.fromMoments(sent - lost, (mean, m2, rtt_min, rtt_max))
+      self.sent_packets += sent
+      self.received_packets += sent - lost
+      self.rtt_stats.merge(rtts)
+      self.done_hosts += hosts
+      self.done_packets += sent
+      if self.window_stats is not None:
+        self.window_stats.addTotals(wire.now(), sent, lost, rtts.mean * rtts.count)
+      hosts_done += hosts
+    return hosts_done
+
+  def refresh(self):
+    """
+    Bring the widgets up to date with everything folded in since the last
+    refresh: one summary tab update, one log flush, and the last state of
+    every host that changed
     """
-    Update the output text area with the replyData string representation
-    Set proper widget states on the BallGrid
-    Calculate summaries cumulatively and set them for display on the summary tab 
+    if not self.dirty:
+      return
+    self.dirty = False
+    set_state = self.led_view.setStateAt
+    for index, state in self.pending_states.items():
+      set_state(index, state)
+    self.pending_states.clear()
+    self.output_log.flush()
+    self.event_log.flush()
+    self.tab_summary.setSummaryData(self.summaryData())
+
+  def summaryData(self):
+    return SummaryData(self.sent_packets, self.received_packets, self.rtt_stats.mean,
+                       self.rtt_stats.stddev(), self.rtt_stats.jitter(),
+                       self.rtt_sketch.quantiles([0.5, 0.95, 0.99]), self.resolve_stats.mean,
+                       self.done_packets / self.done_hosts if self.done_hosts else 0,
+                       self.windowSummary())
+
+  def windowSummary(self):
+    """
+    (sent, lost, mean rtt) over the statistics window, None unless monitoring.
+    The sum goes over every bucket, so it's redone at most every
+    WINDOW_SUMMARY_INTERVAL
+    """
+    if self.window_stats is None:
+      return None
+    now = wire.now()
+    if self.window_summary is None or now - self.window_summary_time >= self.WINDOW_SUMMARY_INTERVAL:
+      self.window_summary = self.window_stats.overall(now)
+      self.window_summary_time = now
+    return self.window_summary
+
+  def hostDone(self, index, timestamp):
+    """
+    Add the host's aggregate reply line to the output log
+    Queue the proper led state for the next refresh
     """
-    self.text_edit_summary.append(str(replyData))
-    packets_lost = replyData.packets_lost
+    packets_lost = self.host_lost[index]
+    received = self.host_sent[index] - packets_lost
+    self.host_done[index] = 1
+    self.done_hosts += 1
+    self.done_packets += self.host_sent[index]
+    #per packet size and mean rtt over the packets that came back
+    size = self.host_size[index] // received if received else 0
+    rtt = round(self.host_rtt[index] / received, 2) if received else 0
+    #the accumulators hold one round, the host's next round starts over
+    self.host_sent[index] = 0
+    self.host_lost[index] = 0
+    self.host_size[index] = 0
+    self.host_rtt[index] = 0
+    self.output_log.append(index, timestamp, size, rtt, packets_lost)
     if packets_lost:
-      self.ball_grid.setStateAt(self.current_ip, BallWidget.UNREACHABLE)
+      self.pending_states[index] = BallWidget.UNREACHABLE
     else:
-      self.ball_grid.setStateAt(self.current_ip, BallWidget.REACHABLE)
-    self.current_ip += 1
-    self.sent_packets += sentPackets 
-    self.received_packets = self.sent_packets - replyData.packets_lost
-    self.average_delay += (replyData.rtt / self.current_ip) #the current_ip reflects the overall number of replies
-    summary_data = SummaryData(self.sent_packets, self.received_packets, self.average_delay)
-    self.tab_summary.setSummaryData(summary_data)
+      self.pending_states[index] = BallWidget.REACHABLE
     
+  def lossyHostCount(self):
+    if self.window_stats is not None:
+      return len(self.window_stats.hostsWithLossAbove(self.LOSSY_PERCENTAGE, wire.now()))
+    return len(self.result_store.hostsWithLossAbove(self.LOSSY_PERCENTAGE))
+
+  def pendingCount(self, indices):
+    """
+    How many of the given hosts haven't been completed yet
+    """
+    return sum(1 for i in indices if not self.host_done[i])
+
   def pingingStoppedHandler(self):
-    self.ball_grid.pingingCancelledHandler()
+    self.refresh()
+    self.led_view.pingingCancelledHandler()
   
 class SummaryTab(QWidget):
   """
@@ -81,6 +265,24 @@ class SummaryTab(QWidget):
     label_output_delay = QLabel("Average Output Delay")
     self.label_output_delay = StyledLabel()
     self.label_output_delay.setMaximumHeight(30)
+    label_rtt_stddev = QLabel("Delay Standard Deviation")
+    self.label_rtt_stddev = StyledLabel()
+    self.label_rtt_stddev.setMaximumHeight(30)
+    label_jitter = QLabel("Jitter")
+    self.label_jitter = StyledLabel()
+    self.label_jitter.setMaximumHeight(30)
+    label_rtt_percentiles = QLabel("Delay p50 / p95 / p99")
+    self.label_rtt_percentiles = StyledLabel()
+    self.label_rtt_percentiles.setMaximumHeight(30)
+    label_packets_per_host = QLabel("Packets per Host")
+    self.label_packets_per_host = StyledLabel()
+    self.label_packets_per_host.setMaximumHeight(30)
+    label_window = QLabel("Recent Loss / Delay")
+    self.label_window = StyledLabel()
+    self.label_window.setMaximumHeight(30)
+    label_resolve_time = QLabel("Average Name Lookup")
+    self.label_resolve_time = StyledLabel()
+    self.label_resolve_time.setMaximumHeight(30)
     #setup summary_layout
     #first, setup a stacked summary_layout to indicate first there's no summary data
     self.layout_stack = QStackedLayout()
@@ -98,6 +300,10 @@ class SummaryTab(QWidget):
     summary_layout.addWidget(label_packets_lost, row, col)
     col += 2
     summary_layout.addWidget(self.label_packets_lost, row, col)
+    row += 1; col -= 2
+    summary_layout.addWidget(label_packets_per_host, row, col)
+    col += 2
+    summary_layout.addWidget(self.label_packets_per_host, row, col)
     row += 1; col -= 2;
     summary_layout.addWidget(label_loss_percentage, row, col)
     col += 2
@@ -106,6 +312,26 @@ class SummaryTab(QWidget):
     summary_layout.addWidget(label_output_delay, row, col)
     col += 2
     summary_layout.addWidget(self.label_output_delay, row, col)
+    row += 1; col -= 2;
+    summary_layout.addWidget(label_rtt_stddev, row, col)
+    col += 2
+    summary_layout.addWidget(self.label_rtt_stddev, row, col)
+    row += 1; col -= 2;
+    summary_layout.addWidget(label_jitter, row, col)
+    col += 2
+    summary_layout.addWidget(self.label_jitter, row, col)
+    row += 1; col -= 2;
+    summary_layout.addWidget(label_rtt_percentiles, row, col)
+    col += 2
+    summary_layout.addWidget(self.label_rtt_percentiles, row, col)
+    row += 1; col -= 2;
+    summary_layout.addWidget(label_window, row, col)
+    col += 2
+    summary_layout.addWidget(self.label_window, row, col)
+    row += 1; col -= 2;
+    summary_layout.addWidget(label_resolve_time, row, col)
+    col += 2
+    summary_layout.addWidget(self.label_resolve_time, row, col)
     #center things out
     summary_layout.setColumnMinimumWidth(1, 100) # 100 pixels in the middle
     summary_layout.setRowMinimumHeight(0, 10) #100 pixels from top
@@ -132,8 +358,19 @@ class SummaryTab(QWidget):
     self.label_sent_packets.setText(str(summaryData.sent_packets))
     self.label_received_packets.setText(str(summaryData.received_packets))
     self.label_packets_lost.setText(str(summaryData.packets_lost))
+    self.label_packets_per_host.setText("%.1f" % summaryData.packets_per_host)
     self.label_loss_percentage.setText("%.2f %%" % summaryData.loss_percentage)
     self.label_output_delay.setText("%.2f ms" % summaryData.output_delay)
+    self.label_rtt_stddev.setText("%.2f ms" % summaryData.rtt_stddev)
+    self.label_jitter.setText("%.2f ms" % summaryData.jitter)
+    self.label_rtt_percentiles.setText("%.2f / %.2f / %.2f ms" % (summaryData.rtt_p50,
+                                       summaryData.rtt_p95, summaryData.rtt_p99))
+    self.label_resolve_time.setText("%.2f ms" % summaryData.resolve_time)
+    if summaryData.window is None:
+      self.label_window.setText("-")
+    else:
+      sent, lost, rtt = summaryData.window
+      self.label_window.setText("%.2f %% / %.2f ms" % (lost / sent * 100 if sent else 0, rtt))
     self.layout_stack.setCurrentIndex(0)
     
   def zeroOut(self):
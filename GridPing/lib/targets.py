@@ -0,0 +1,144 @@
+"""
+Ping targets held as integer address intervals instead of lists of strings.
+A /12 is one (start, end) pair here; the ip strings are only made when
+somebody indexes or iterates the set, which the pinger does one host at a time.
+"""
+import socket, struct, re
+from bisect import bisect_right
+
+HOSTNAME_REGEXP = re.compile(r"^(?=.{1,253}$)[A-Za-z0-9]([A-Za-z0-9-]{0,61}[A-Za-z0-9])?"
+                             r"(\.[A-Za-z0-9]([A-Za-z0-9-]{0,61}[A-Za-z0-9])?)*$")
+IP_REGEXP = re.compile(r"^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$")
+
+def ipToInt(ip):
+  ip = ip.replace(' ', '') #masked line edits pad with spaces
+  if not IP_REGEXP.match(ip):
+    raise ValueError("Invalid IP: %s" % ip)
+  n = 0
+  for group in ip.split('.'): #not inet_aton, it reads zero padded groups as octal
+    if int(group) > 255:
+      raise ValueError("Invalid IP: %s" % ip)
+    n = (n << 8) | int(group)
+  return n
+
+def intToIp(n):
+  return socket.inet_ntoa(struct.pack("!I", n))
+
+
+class TargetSet(object):
+  """
+  An ordered collection of targets that reads like a list of strings
+  (len, indexing, slicing, iteration). Addresses are kept as inclusive
+  (start, end) integer intervals, hostnames as single entries.
+  """
+  def __init__(self):
+    super(TargetSet, self).__init__()
+    self._segments = [] #(start, end) int pairs, or a hostname string
+    self._offsets = [] #index of the first target of each segment
+    self._length = 0
+
+  def addRange(self, start, end):
+    if end < start:
+      raise ValueError("Range end %s is before its start %s" % (intToIp(end), intToIp(start)))
+    self._offsets.append(self._length)
+    self._segments.append((start, end))
+    self._length += end - start + 1
+
+  def addHost(self, host):
+    self._offsets.append(self._length)
+    self._segments.append(host)
+    self._length += 1
+
+  def segments(self):
+    return list(self._segments)
+
+  def __len__(self):
+    return self._length
+
+  def __getitem__(self, i):
+    if isinstance(i, slice):
+      return TargetView(self, range(*i.indices(self._length)))
+    if i < 0:
+      i += self._length
+    if not 0 <= i < self._length:
+      raise IndexError("target index out of range")
+    k = bisect_right(self._offsets, i) - 1
+    segment = self._segments[k]
+    if isinstance(segment, tuple):
+      return intToIp(segment[0] + i - self._offsets[k])
+    return segment
+
+  def __iter__(self):
+    for segment in self._segments:
+      if isinstance(segment, tuple):
+        for n in range(segment[0], segment[1] + 1):
+          yield intToIp(n)
+      else:
+        yield segment
+
+
+class TargetView(object):
+  """
+  Some of the targets of a TargetSet, picked by a range of indices.
+  Pickles as the parent's intervals plus the range, so it is cheap to
+  hand a shard of a big scan to a worker process.
+  """
+  def __init__(self, targets, indices):
+    super(TargetView, self).__init__()
+    self.targets = targets
+    self.indices = indices
+
+  def __len__(self):
+    return len(self.indices)
+
+  def __getitem__(self, i):
+    if isinstance(i, slice):
+      return TargetView(self.targets, self.indices[i])
+    return self.targets[self.indices[i]]
+
+  def __iter__(self):
+    for i in self.indices:
+      yield self.targets[i]
+
+
+def parseTargets(text):
+  """
+  Parse a comma (or whitespace) separated target list into a TargetSet.
+  Each item is one of:
+    10.0.0.0/24           -- CIDR block (network and broadcast addresses skipped below /31)
+    10.0.0.5-10.0.3.20    -- inclusive range, may cross octets
+    10.0.0.5-20           -- range on the last octet
+    10.0.0.1              -- single ip
+    www.example.com       -- hostname
+  Raises ValueError for anything else.
+  """
+  targets = TargetSet()
+  for item in re.split(r"[,\s]+", text.strip()):
+    if not item:
+      continue
+    if '/' in item:
+      ip, prefix = item.split('/', 1)
+      if not prefix.isdigit() or int(prefix) > 32:
+        raise ValueError("Invalid prefix length: %s" % item)
+      prefix = int(prefix)
+      mask = (0xffffffff << (32 - prefix)) & 0xffffffff
+      start = ipToInt(ip) & mask
+      end = start | (~mask & 0xffffffff)
+      if prefix < 31:
+        start += 1; end -= 1
+      targets.addRange(start, end)
+    elif '-' in item and IP_REGEXP.match(item.split('-', 1)[0]):
+      first, last = item.split('-', 1)
+      if last.isdigit():
+        last = first[:first.rfind('.') + 1] + last
+      targets.addRange(ipToInt(first), ipToInt(last))
+    elif IP_REGEXP.match(item):
+      n = ipToInt(item)
+      targets.addRange(n, n)
+    elif HOSTNAME_REGEXP.match(item):
+      targets.addHost(item)
+    else:
+      raise ValueError("Invalid target: %s" % item)
+  if not len(targets):
+    raise ValueError("No targets given")
+  return targets
@@ -0,0 +1,101 @@
+"""
+Hierarchical timer wheel, for scheduling lots of sends on absolute deadlines
+at O(1) cost per timer.
+"""
+import math
+
+class TimerWheel(object):
+  """
+  Timers are kept in buckets of `resolution` seconds. Level 0 has a bucket
+  per tick for the next 2**slotBits ticks, every level above covers
+  2**slotBits times the span of the one below, and its buckets are cascaded
+  down as the wheel turns. Scheduling and expiring cost the same however many
+  timers are pending; a timer fires at most one tick late, never early.
+  Deadlines further than the top level reaches (~49 days with the defaults)
+  wait at its far end and get placed again when the wheel comes round.
+  """
+  def __init__(self, start, resolution=0.001, slotBits=8, levels=4):
+    super(TimerWheel, self).__init__()
+    self.resolution = resolution
+    self._bits = slotBits
+    self._mask = (1 << slotBits) - 1
+    self._levels = levels
+    self._wheels = [[[] for _ in range(1 << slotBits)] for _ in range(levels)]
+    self._tick = int(start / resolution) #the next tick to expire
+    self._count = 0
+
+  def __len__(self):
+    return self._count
+
+  def schedule(self, deadline, item):
+    """
+    deadline is in the same clock as the times passed to advance()
+    """
+    self._insert(max(int(math.ceil(deadline / self.resolution)), self._tick), item)
+    self._count += 1
+
+  def _insert(self, tick, item):
+    delta = tick - self._tick
+    for level in range(self._levels):
+      if delta >> (self._bits * (level + 1)) == 0:
+        break
+    else: #beyond the wheel, park it as far as it goes, it's placed again from there
+      level = self._levels - 1
+      slot_tick = self._tick + (1 << (self._bits * self._levels)) - 1
+      self._wheels[level][(slot_tick >> (self._bits * level)) & self._mask].append((tick, item))
+      return
+    self._wheels[level][(tick >> (self._bits * level)) & self._mask].append((tick, item))
+
+  def _cascade(self, level):
+    """
+    Move the bucket of `level` the wheel just turned to into the levels below
+    """
+    if level >= self._levels:
+      return
+    index = (self._tick >> (self._bits * level)) & self._mask
+    if index == 0:
+      self._cascade(level + 1)
+    bucket = self._wheels[level][index]
+    if bucket:
+      self._wheels[level][index] = []
+      for tick, item in bucket:
+        self._insert(tick, item)
+
+  def advance(self, now):
+    """
+    Returns the items whose deadline is at or before now, in deadline order
+    (give or take a tick)
+    """
+    target = int(now / self.resolution)
+    if not self._count:
+      self._tick = max(self._tick, target + 1)
+      return []
+    expired = []
+    wheel = self._wheels[0]
+    while self._tick <= target and self._count:
+      index = self._tick & self._mask
+      bucket = wheel[index]
+      if bucket:
+        wheel[index] = []
+        expired.extend(item for tick, item in bucket)
+        self._count -= len(bucket)
+      self._tick += 1
+      if index == self._mask: #turned over, bring the next span down to level 0
+        self._cascade(1)
+    if not self._count:
+      self._tick = max(self._tick, target + 1)
+    return expired
+
+  def nextDeadline(self):
+    """
+    When advance() should be called next: the deadline of the first timer
+    in the next 2**slotBits ticks, or the time the wheel has to cascade
+    otherwise. None when nothing is scheduled.
+    """
+    if not self._count:
+      return None
+    wheel = self._wheels[0]
+    for tick in range(self._tick, (self._tick | self._mask) + 1):
+      if wheel[tick & self._mask]:
+        return tick * self.resolution
+    return ((self._tick | self._mask) + 1) * self.resolution
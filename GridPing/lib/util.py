@@ -1,5 +1,7 @@
 from __future__ import division
-import os, ctypes, datetime
+import os, datetime
+
+WIRE_OVERHEAD = 28 #ip and icmp headers on top of the payload, for byte rates
 
 class RequestData(object):
   DISTRIBUTION_CONSTANT = 0
@@ -7,33 +9,90 @@ class RequestData(object):
   DISTRIBUTION_GAUSSIAN = 2
   DISTRIBUTION_POISSON = 3
   DISTRIBUTION_EXPONENTIAL = 4
-  def __init__(self, buffSize, timeOut, delay, packetCount, distribution=DISTRIBUTION_CONSTANT):
+  DEFAULT_CONCURRENCY = 256 #probes kept in flight at the same time
+  DEFAULT_HISTORY_SAMPLES = 20000000 #samples the history keeps at most, around a GB on disk
+  BACKEND_AUTO = 0 #raw icmp when admin, unprivileged icmp otherwise
+  BACKEND_RAW_ICMP = 1
+  BACKEND_DGRAM_ICMP = 2
+  BACKEND_TCP = 3
+  BACKEND_FAKE = 4
+  def __init__(self, buffSize, timeOut, delay, packetCount, distribution=DISTRIBUTION_CONSTANT,
+               concurrency=DEFAULT_CONCURRENCY, workers=None, backend=BACKEND_AUTO, port=80,
+               backendOptions=None, packetRate=0, byteRate=0, adaptiveTimeout=False,
+               sweep=False, earlyStop=False, lossPrecision=0.1, rttPrecision=0.1,
+               roundPeriod=0, statsWindow=900, changeOnly=False, rttBand=0.25,
+               historyPath=None, historyRetention=30 * 86400,
+               historyMaxSamples=DEFAULT_HISTORY_SAMPLES):
     self.buf_size = buffSize
     self.timeout = timeOut
     self.delay = delay
     self.packet_count = packetCount
     self.distribution = distribution
+    self.concurrency = max(1, concurrency)
+    self.workers = workers #number of pinger processes, None means one per core
+    self.backend = backend
+    self.port = port #for the tcp backend
+    self.backend_options = backendOptions or {} #passed to the backend, see lib.backends
+    #limits over all the workers together, 0 for none (see lib.rate_limit)
+    self.packet_rate = packetRate #packets per second
+    self.byte_rate = byteRate #bytes per second
+    #timeouts follow the rtts seen, up to timeout (see lib.rtt_estimator)
+    self.adaptive_timeout = adaptiveTimeout
+    #probe every host for liveness first, measure only those that answered
+    self.sweep = sweep
+    #stop probing a host once its loss rate and rtt are that precise, packet_count
+    #being the most it gets (see lib.early_stop)
+    self.early_stop = earlyStop
+    self.loss_precision = lossPrecision #half width of the loss rate's 95% interval
+    self.rtt_precision = rttPrecision #relative standard error of the mean rtt
+    #continuous monitoring: seconds between the starts of two rounds, 0 pings once
+    self.round_period = roundPeriod
+    self.stats_window = statsWindow #seconds of history the rolling per host statistics cover
+    #rounds only report the hosts whose reachability, loss or rtt changed
+    self.change_only = changeOnly
+    self.rtt_band = rttBand #relative rtt change that counts as a change
+    #sqlite database the pingers keep every sample in, see lib.history_store
+    self.history_path = historyPath
+    self.history_retention = historyRetention #seconds
+    self.history_max_samples = historyMaxSamples #the oldest samples past that go, None keeps all
     
   def __str__(self):
-    return "<RequestData buffSize={} timeOut={} delay={} packetCount={} distribution=%s >".\
-             format(self.buf_size, self.timeout, self.delay, self.packet_count, self.distribution)
+    return "<RequestData {} >".format(" ".join("{}={}".format(name, value)
+                                       for name, value in sorted(vars(self).items())))
     
 
+DATE_FORMAT = "%Y-%m-%d %I-%M-%S%p"
+
+def formatReply(date, dest, size, rtt, packetsLost):
+  """
+  The line shown in the output log for a host
+  """
+  if packetsLost > 0:
+    return "{} Reply from {} Request timed out".format(date, dest)
+  return "{} Reply from {} bytes={} time={}ms".format(date, dest, size, rtt)
+
+def formatTimestamp(timestamp):
+  """timestamp is in ms since the epoch, as carried in wire records"""
+  return datetime.datetime.fromtimestamp(timestamp / 1000).strftime(DATE_FORMAT)
+
 class ReplyData(object):
   """
   Carries the reply data from the pinger thread to the gui thread.
   Responsible for correct message content and formatting, based on reply data.
+  index is the position of the host in the pinged list; replies may arrive
+  out of order when hosts are probed concurrently.
   """
-  def __init__(self, dest='', size=0, rtt=0, packetsLost=0, finalReply=False):
-    self.date = datetime.datetime.now().strftime("%Y-%m-%d %I-%M-%S%p")
+  def __init__(self, dest='', size=0, rtt=0, packetsLost=0, finalReply=False, index=None):
+    self.date = datetime.datetime.now().strftime(DATE_FORMAT)
     self.dest = dest
     self.size = size
     try:
-      self.rtt = float(rtt) #rtt is returned from the pyping library as a string, None in failure
+      self.rtt = float(rtt) #rtt may come as a string, None in failure
     except TypeError:
       self.rtt = 0
     self.packets_lost = packetsLost
     self.final_reply = finalReply
+    self.index = index
 
   def __add__(self, other):
     dest = self.dest if len(self.dest) > len(other.dest) else other.dest
@@ -41,20 +100,24 @@ class ReplyData(object):
     rtt = self.rtt + other.rtt
     packets_lost = self.packets_lost + other.packets_lost
     final_reply = self.final_reply or other.final_reply
-    return ReplyData(dest, size, rtt, packets_lost, final_reply)
+    index = self.index if self.index is not None else other.index
+    return ReplyData(dest, size, rtt, packets_lost, final_reply, index)
   
   def __str__(self):
-    if self.packets_lost > 0:
-      return "{} Reply from {} Request timed out".format(self.date,
-                              self.dest)
-    return "{} Reply from {} bytes={} time={}ms".format(self.date,
-                              self.dest, self.size, self.rtt)
+    return formatReply(self.date, self.dest, self.size, self.rtt, self.packets_lost)
     
 class SummaryData(object):
   """
   Data collected to put in the summary section
   """
-  def __init__(self, sentPackets, receivedPackets, outputDelay):
+  def __init__(self, sentPackets, receivedPackets, outputDelay, rttStddev=0, jitter=0,
+               rttPercentiles=(0, 0, 0), resolveTime=0, packetsPerHost=0, window=None):
+    """
+    outputDelay is the mean rtt of the received packets, rttPercentiles
+    the (p50, p95, p99) rtts, resolveTime the mean name lookup time, all in ms.
+    packetsPerHost is the mean number of packets the finished hosts got.
+    window is (sent, lost, mean rtt) over the statistics window when monitoring
+    """
     self.sent_packets = sentPackets
     self.received_packets = receivedPackets
     self.packets_lost = self.sent_packets - self.received_packets
@@ -63,10 +126,17 @@ class SummaryData(object):
     except ZeroDivisionError:
       self.loss_percentage = 0
     self.output_delay = outputDelay
+    self.rtt_stddev = rttStddev
+    self.jitter = jitter
+    self.rtt_p50, self.rtt_p95, self.rtt_p99 = rttPercentiles
+    self.resolve_time = resolveTime
+    self.packets_per_host = packetsPerHost
+    self.window = window
     
 
 def isAdminCurrent():
   try:
     return os.getuid() == 0
   except AttributeError:
+    import ctypes
     return ctypes.windll.shell32.IsUserAnAdmin() != 0
\ No newline at end of file
@@ -0,0 +1,121 @@
+from __future__ import division
+import numpy as np
+from lib import wire
+from lib.result_store import frameRecords
+
+class WindowStats(object):
+  """
+  Per host packet and rtt counts over a sliding time window, for monitoring
+  runs that go on for days. The window is cut into `buckets` time buckets,
+  each a row of per host counters (sent, lost, rtt sum) in a ring of numpy
+  arrays, and a bucket is zeroed when its slot comes round again. Memory is
+  buckets x hosts counters however long the run, and the window slides a
+  bucket at a time.
+  Counts that aren't tied to a host (FRAME_TOTALS, see addTotals) go to an
+  extra column, they show in overall() only.
+  """
+  def __init__(self, hostCount, window=900, buckets=15):
+    super(WindowStats, self).__init__()
+    self.host_count = hostCount
+    self.buckets = buckets
+    self.bucket_ms = max(1, int(window * 1000 // buckets))
+    self.sent = np.zeros((buckets, hostCount + 1), np.uint32)
+    self.lost = np.zeros((buckets, hostCount + 1), np.uint32)
+    self.rtt_sum = np.zeros((buckets, hostCount + 1), np.float64)
+    self.bucket_ids = np.full(buckets, -1, np.int64) #time bucket each slot holds
+
+  def addFrame(self, frame):
+    records = frameRecords(frame)
+    self.add(records["index"], records["timestamp"], records["rtt"],
+             (records["flags"] & wire.FLAG_LOST).astype(bool))
+
+  def addTotals(self, timestamp, sent, lost, rttSum):
+    """
+    Counts of unnamed hosts, e.g. the ones a change-only pinger held back
+    """
+    slot = self._slotFor(timestamp // self.bucket_ms)
+    if slot is None:
+      return
+    self.sent[slot, self.host_count] += sent
+    self.lost[slot, self.host_count] += lost
+    self.rtt_sum[slot, self.host_count] += rttSum
+
+  def _slotFor(self, bucketId):
+    """
+    Slot of a time bucket, cleared first if it held an older bucket; None
+    for buckets older than the window
+    """
+    slot = bucketId % self.buckets
+    if bucketId < self.bucket_ids[slot]:
+      return None
+    if bucketId > self.bucket_ids[slot]:
+      self.clearSlot(slot, bucketId)
+    return slot
+
+  def add(self, hosts, timestamps, rtts, lost):
+    ids = timestamps // self.bucket_ms
+    for bucket_id in np.unique(ids): #a frame rarely straddles more than one bucket
+      slot = self._slotFor(bucket_id)
+      if slot is None:
+        continue #older than the window
+      selected = ids == bucket_id
+      host = hosts[selected]
+      np.add.at(self.sent[slot], host, 1)
+      np.add.at(self.lost[slot], host[lost[selected]], 1)
+      received = ~lost[selected]
+      np.add.at(self.rtt_sum[slot], host[received], rtts[selected][received])
+
+  def clearSlot(self, slot, bucketId=-1):
+    self.sent[slot] = 0
+    self.lost[slot] = 0
+    self.rtt_sum[slot] = 0
+    self.bucket_ids[slot] = bucketId
+
+  def expire(self, nowMs):
+    """
+    Drop the buckets that slid out of the window
+    """
+    oldest = nowMs // self.bucket_ms - self.buckets + 1
+    for slot in np.flatnonzero((self.bucket_ids >= 0) & (self.bucket_ids < oldest)):
+      self.clearSlot(slot)
+
+  def totals(self, nowMs=None):
+    """
+    Per host (sent, lost, rtt sum) over the window
+    """
+    sent, lost, rtt_sum = self._columnTotals(nowMs)
+    return sent[:-1], lost[:-1], rtt_sum[:-1]
+
+  def _columnTotals(self, nowMs):
+    if nowMs is not None:
+      self.expire(nowMs)
+    return (self.sent.sum(axis=0, dtype=np.int64), self.lost.sum(axis=0, dtype=np.int64),
+            self.rtt_sum.sum(axis=0))
+
+  def lossRates(self, nowMs=None):
+    """Per host fraction of packets lost, NaN for hosts without samples"""
+    sent, lost, rtt_sum = self.totals(nowMs)
+    with np.errstate(invalid="ignore", divide="ignore"):
+      return lost / sent
+
+  def meanRtts(self, nowMs=None):
+    """Per host mean rtt of the packets that came back, NaN for hosts that never answered"""
+    sent, lost, rtt_sum = self.totals(nowMs)
+    with np.errstate(invalid="ignore", divide="ignore"):
+      return rtt_sum / (sent - lost)
+
+  def hostsWithLossAbove(self, percentage, nowMs=None):
+    """
+    Indices of the hosts losing more than `percentage` percent of their packets
+    in the window
+    """
+    with np.errstate(invalid="ignore"):
+      return np.flatnonzero(self.lossRates(nowMs) * 100 > percentage)
+
+  def overall(self, nowMs=None):
+    """
+    (sent, lost, mean rtt) over every host in the window
+    """
+    sent, lost, rtt_sum = self._columnTotals(nowMs)
+    sent = int(sent.sum()); lost = int(lost.sum())
+    return sent, lost, float(rtt_sum.sum()) / (sent - lost) if sent > lost else 0.0
@@ -0,0 +1,140 @@
+"""
+Binary format of the messages going from the pingers to the gui.
+A frame is a small header (frame type, record count) followed by fixed size
+records, one per packet sent:
+  host index -- position of the host in the pinged list
+  timestamp  -- when the reply (or timeout) came in, ms since the epoch
+  size       -- packet size in bytes
+  rtt        -- round trip time in ms, 0 for lost packets
+  flags      -- FLAG_LOST, FLAG_HOST_DONE (last packet for that host)
+Records are batched, so a frame costs one pipe write however many packets
+it carries, and the reader unpacks them without any pickling.
+FRAME_RESOLVE frames carry (host index, lookup time in ms) records for the
+hostnames the pinger had to resolve.
+FRAME_ROUND frames carry a single (round number, timestamp) record, sent by
+pingers running rounds once every host of a round is done.
+Pingers that only report changes (see lib.change_filter) also send:
+  FRAME_TRANSITION -- (host index, timestamp, TRANSITION_UP/DOWN) records,
+                      for hosts whose reachability flipped
+  FRAME_TOTALS     -- a single (hosts, sent, lost, rtt mean, rtt m2, rtt min,
+                      rtt max) record per round, covering the hosts whose
+                      records weren't sent because nothing changed
+"""
+import struct, time
+
+HEADER = struct.Struct("<BI")
+RECORD = struct.Struct("<IqIfB")
+RESOLVE_RECORD = struct.Struct("<If")
+ROUND_RECORD = struct.Struct("<Iq")
+TRANSITION_RECORD = struct.Struct("<IqB")
+TOTALS_RECORD = struct.Struct("<IIIdddd")
+
+FRAME_RECORDS = 0
+FRAME_FINAL = 1 #the writer is done, no more frames after this one
+FRAME_RESOLVE = 2
+FRAME_ROUND = 3
+FRAME_TRANSITION = 4
+FRAME_TOTALS = 5
+
+RECORD_STRUCTS = {FRAME_RECORDS: RECORD, FRAME_RESOLVE: RESOLVE_RECORD, FRAME_ROUND: ROUND_RECORD,
+                  FRAME_TRANSITION: TRANSITION_RECORD, FRAME_TOTALS: TOTALS_RECORD}
+
+FLAG_LOST = 1
+FLAG_HOST_DONE = 2
+
+TRANSITION_DOWN = 0
+TRANSITION_UP = 1
+
+BATCH_SIZE = 256 #records per frame
+MAX_LATENCY = 0.05 #seconds a record may wait for its frame to fill up
+
+def now():
+  return int(time.time() * 1000)
+
+def frameType(frame):
+  return frame[0]
+
+def recordCount(frame):
+  return HEADER.unpack_from(frame)[1]
+
+def iterRecords(frame):
+  """
+  Yields a tuple per record in the frame, (index, timestamp, size, rtt, flags)
+  for FRAME_RECORDS
+  """
+  return RECORD_STRUCTS[frameType(frame)].iter_unpack(memoryview(frame)[HEADER.size:])
+
+def encodeFrame(frameType, count=0, payload=b''):
+  return HEADER.pack(frameType, count) + payload
+
+
+class FrameWriter(object):
+  """
+  Packs records into frames and sends them down a pipe (anything with send_bytes)
+  once BATCH_SIZE records of a kind are waiting, or the oldest waiting record
+  is older than MAX_LATENCY. Writers driven by an event loop should also call
+  flushIfStale() periodically, so a trickle of replies doesn't sit in the buffer.
+  """
+  def __init__(self, pipe, batchSize=BATCH_SIZE, maxLatency=MAX_LATENCY):
+    super(FrameWriter, self).__init__()
+    self.pipe = pipe
+    self.batch_size = batchSize
+    self.max_latency = maxLatency
+    self._buffers = dict((frame_type, bytearray()) for frame_type in RECORD_STRUCTS)
+    self._counts = dict((frame_type, 0) for frame_type in RECORD_STRUCTS)
+    self._waiting = 0
+    self._first_write = 0
+
+  def write(self, index, size, rtt, flags=0, timestamp=None):
+    if timestamp is None:
+      timestamp = now()
+    self.append(FRAME_RECORDS, RECORD.pack(index, timestamp, size, rtt, flags))
+
+  def writeResolve(self, index, ms):
+    self.append(FRAME_RESOLVE, RESOLVE_RECORD.pack(index, ms))
+
+  def writeTransition(self, index, timestamp, state):
+    self.append(FRAME_TRANSITION, TRANSITION_RECORD.pack(index, timestamp, state))
+
+  def writeTotals(self, hosts, sent, lost, rttMoments):
+    """
+    rttMoments is (mean, m2, min, max) of the received packets' rtts, see RunningStats
+    """
+    self.append(FRAME_TOTALS, TOTALS_RECORD.pack(hosts, sent, lost, *rttMoments))
+
+  def writeRound(self, roundNumber):
+    """
+    Mark the end of a round, after every record written so far
+    """
+    self.flush() #frames go out by type, the round's records mustn't trail its marker
+    self.append(FRAME_ROUND, ROUND_RECORD.pack(roundNumber, now()))
+    self.flush()
+
+  def append(self, frameType, record):
+    if not self._waiting:
+      self._first_write = time.time()
+    self._buffers[frameType] += record
+    self._counts[frameType] += 1
+    self._waiting += 1
+    if self._counts[frameType] >= self.batch_size:
+      self.flush()
+    else:
+      self.flushIfStale()
+
+  def flushIfStale(self):
+    if self._waiting and time.time() - self._first_write >= self.max_latency:
+      self.flush()
+
+  def flush(self):
+    if not self._waiting:
+      return
+    for frame_type, count in self._counts.items():
+      if count:
+        self.pipe.send_bytes(encodeFrame(frame_type, count, bytes(self._buffers[frame_type])))
+        self._buffers[frame_type] = bytearray()
+        self._counts[frame_type] = 0
+    self._waiting = 0
+
+  def finish(self):
+    self.flush()
+    self.pipe.send_bytes(encodeFrame(FRAME_FINAL))
@@ -1,11 +1,14 @@
-from PySide.QtCore import *
-from PySide.QtGui import *
+from PySide6.QtWidgets import *
+from PySide6.QtGui import *
+from PySide6.QtCore import *
 import sys
-from multiprocessing import Pipe, Process
 from lib.ip_section import IpSection
-from lib.pinger import Pinger
+from lib.sharded_pinger import ShardedPinger
+from lib import wire
 from lib.summary_section import SummarySection
 from lib.option_section import OptionSection
+from lib.rate_limit import RateMeter
+from lib.util import WIRE_OVERHEAD
 
 
 class MasterWindow(QMainWindow):
@@ -13,6 +16,9 @@ class MasterWindow(QMainWindow):
   Manages the general layout and event propagation through
   the gui. (pulls the strings :])
   """
+  DRAIN_BUDGET = 16 #frames handled per wakeup, so a burst can't freeze the event loop
+  POLL_INTERVAL = 50 #ms, only used where pipes can't be watched
+  REFRESH_INTERVAL = 33 #ms, replies reach the widgets at most this often (~30 fps)
   def __init__(self, parent=None):
     super(MasterWindow, self).__init__(parent)
     #setup the ip section
@@ -52,10 +58,16 @@ class MasterWindow(QMainWindow):
     widget = QWidget()
     widget.setLayout(layout)
     self.setCentralWidget(widget)
-    #setup a poll timer
+    #replies are picked up as soon as a worker pipe becomes readable.
+    #pipes aren't sockets on windows, so there we fall back to polling
+    self._notifiers = {}
     self._timer = QTimer()
-    self._timer.setInterval(1000)
+    self._timer.setInterval(self.POLL_INTERVAL)
     self._timer.timeout.connect(self.pollReplyPipe)
+    #replies are folded in as they come, the widgets are redrawn on this timer
+    self._refresh_timer = QTimer()
+    self._refresh_timer.setInterval(self.REFRESH_INTERVAL)
+    self._refresh_timer.timeout.connect(self.refreshWidgets)
     #setup the status bar
     self.lbl_status = QLabel()
     self.lbl_status.setStyleSheet("""
@@ -75,41 +87,117 @@ class MasterWindow(QMainWindow):
   def startPinging(self, ips):
     self.pinging_started = True
     self.ping_index = 0
+    self.hosts_done = 0
+    self.rounds_done = 0
     self.ping_ips = ips
     self.progressbar_pinging.reset()
     self.progressbar_pinging.setMinimum(0)
     self.progressbar_pinging.setMaximum(len(ips))
-    self.summary_section.setIPs(ips)
-    self.option_section.disableWidgets()
-    self.receive_pipe, send_pipe = Pipe(duplex=False)
     self.request_data = self.option_section.getOptions()
-    self.pinger = Pinger(ips, self.request_data, send_pipe) 
-    self.pinger_process = Process(target=self.pinger.run)
+    self.summary_section.setIPs(ips, self.request_data)
+    self.option_section.disableWidgets()
+    #the sharded pinger spreads the ips over worker processes and reads like a pipe
+    self.pinger_process = ShardedPinger(ips, self.request_data, self.request_data.workers)
+    self.receive_pipe = self.pinger_process
     self.pinger_process.start()
+    self.send_rate = RateMeter()
     self.lbl_status.setText("Pinging %s ..." % ips[0])
     self.ping_index += 1
-    self._timer.start()
+    self.watchReplyPipe()
+    self._refresh_timer.start()
     
-  def pollReplyPipe(self):
-    while self.receive_pipe.poll():
-      reply_data = self.receive_pipe.recv() 
-      if reply_data.final_reply: #pinging finished
-        self._timer.stop()
+  def watchReplyPipe(self):
+    if sys.platform == "win32":
+      self._timer.start()
+      return
+    for fd in self.receive_pipe.liveFilenos():
+      notifier = QSocketNotifier(fd, QSocketNotifier.Read)
+      notifier.activated.connect(self.pollReplyPipe)
+      self._notifiers[fd] = notifier
+      
+  def unwatchReplyPipe(self, liveFds=()):
+    """
+    Stop watching the pipes that are no longer sending, all of them by default.
+    A finished pipe stays readable (EOF), leaving it watched would spin
+    """
+    for fd in list(self._notifiers):
+      if fd not in liveFds:
+        notifier = self._notifiers.pop(fd)
+        notifier.setEnabled(False)
+        notifier.deleteLater()
+    if not liveFds:
+      self._timer.stop()
+
+  def pollReplyPipe(self, *args):
+    budget = self.DRAIN_BUDGET
+    while budget and self.pinging_started and self.receive_pipe.poll():
+      budget -= 1
+      frame = self.receive_pipe.recv_bytes()
+      if wire.frameType(frame) == wire.FRAME_FINAL: #pinging finished
+        self.unwatchReplyPipe()
+        self._refresh_timer.stop()
+        self.refreshWidgets()
         self.pinger_process.terminate()
         self.pinger_process.join()
         self.pinging_started = False # positioning this is crucial before emitting the signal
         self.ip_section.pingStoppedHandler()
         self.option_section.enableWidgets()
-        self.lbl_status.setText("Done")
+        failed = self.summary_section.pendingCount(self.pinger_process.failedIndices())
+        if failed: #a worker died, whatever it didn't get to is cancelled
+          self.summary_section.pingingStoppedHandler()
+          self.lbl_status.setText("Done (%d hosts lost to a failed worker)" % failed)
+        else:
+          self.lbl_status.setText("Done, %d hosts lost more than %d%% of packets" %
+                                  (self.summary_section.lossyHostCount(),
+                                   self.summary_section.LOSSY_PERCENTAGE))
+      elif wire.frameType(frame) == wire.FRAME_ROUND: #every host went through another round
+        self.rounds_done += 1
       else: 
-        self.summary_section.takeReplyData(reply_data, self.request_data.packet_count)
-        try: #because indexing will fail in after the last IP.We index 1 IP ahead of requests
-          self.lbl_status.setText("Pinging %s ..." % self.ping_ips[self.ping_index])
-        except IndexError:
-          pass
-        self.ping_index += 1
-      self.progressbar_pinging.setValue(self.progressbar_pinging.value() + 1)
+        if wire.frameType(frame) == wire.FRAME_RECORDS:
+          self.send_rate.add(wire.recordCount(frame))
+        elif wire.frameType(frame) == wire.FRAME_TOTALS: #packets of hosts held back as unchanged
+          self.send_rate.add(sum(record[1] for record in wire.iterRecords(frame)))
+        hosts_done = self.summary_section.takeReplyFrame(frame)
+        self.ping_index += hosts_done
+        self.hosts_done += hosts_done
+    if self.pinging_started:
+      self.unwatchReplyPipe(self.receive_pipe.liveFilenos())
+      if not budget: #out of budget, come back for the rest after pending events
+        QTimer.singleShot(0, self.pollReplyPipe)
     
+  def refreshWidgets(self):
+    """
+    Show what came in since the last refresh, called every REFRESH_INTERVAL
+    When monitoring, the progress bar goes through every round
+    """
+    self.summary_section.refresh()
+    if self.request_data.round_period:
+      progress = self.hosts_done % len(self.ping_ips)
+      if self.progressbar_pinging.value() != progress:
+        self.progressbar_pinging.setValue(progress)
+        self.lbl_status.setText("Round %d, %d of %d hosts ... %s" % (self.rounds_done + 1,
+                                progress, len(self.ping_ips), self.rateText()))
+    elif self.progressbar_pinging.value() != self.hosts_done:
+      self.progressbar_pinging.setValue(self.hosts_done)
+      try: #because indexing will fail in after the last IP.We index 1 IP ahead of requests
+        self.lbl_status.setText("Pinging %s ... %s" % (self.ping_ips[self.ping_index - 1],
+                                                       self.rateText()))
+      except IndexError:
+        pass
+
+  def rateText(self):
+    """
+    Achieved send rate, against the limit when there's one
+    """
+    text = "%d packets/s" % self.send_rate.rate()
+    if self.request_data.packet_rate:
+      text += " (limit %d)" % self.request_data.packet_rate
+    if self.request_data.byte_rate:
+      wire_size = self.request_data.buf_size + WIRE_OVERHEAD
+      text += ", %.1f of %.1f KB/s" % (self.send_rate.rate() * wire_size / 1000,
+                                      self.request_data.byte_rate / 1000)
+    return text
+
   def endPinging(self):
     if self.pinging_started:
       msg_box = QMessageBox()
@@ -118,9 +206,11 @@ class MasterWindow(QMainWindow):
       msg_box.setText("Operation still running")
       msg_box.setInformativeText("Are you sure you want to stop it?")
       msg_box.setStandardButtons(QMessageBox.Yes | QMessageBox.No)
-      resp = msg_box.exec_()
+      resp = msg_box.exec()
       if resp == QMessageBox.Yes:
         #enable buttons (common function), display summaries
+        self.unwatchReplyPipe()
+        self._refresh_timer.stop()
         self.pinger_process.terminate()
         self.pinger_process.join()
         self.pinging_started = False
@@ -135,4 +225,4 @@ if __name__ == "__main__":
   app = QApplication(sys.argv)
   main = MasterWindow()
   main.show()
-  sys.exit(app.exec_())
\ No newline at end of file
+  sys.exit(app.exec())
\ No newline at end of file